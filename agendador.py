@@ -0,0 +1,55 @@
+"""
+Tarefas periódicas em segundo plano (uma thread por tarefa, por worker)
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TarefaPeriodica:
+    """Executa `tarefa()` a cada `intervalo` segundos numa thread daemon.
+
+    A primeira execução acontece um intervalo após `iniciar()` (até lá quem
+    lê calcula sob demanda). `executar_agora()` antecipa a próxima execução
+    (ex.: após uma alteração nos dados). Erros são registrados no log e não
+    interrompem o agendamento.
+    """
+
+    def __init__(self, nome, intervalo, tarefa):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.tarefa = tarefa
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def ativa(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        if self.ativa:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name=self.nome, daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def executar_agora(self):
+        self._acordar.set()
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if self._parar.is_set():
+                return
+            try:
+                self.tarefa()
+            except Exception:
+                logger.exception('Falha na tarefa periódica %s', self.nome)
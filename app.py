@@ -3,32 +3,159 @@ Sistema de Gestão de Ativos de Telecomunicações - PEIXOTO GRUPO EMPRESARIAL
 VERSÃO DEFINITIVA COMPLETA COM SQLAlchemy + GLOBAL CONTEXT + PAGINAÇÃO
 """
 
-from datetime import datetime, date, timedelta
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file
+from datetime import datetime, date, timedelta, timezone
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file, Response, stream_with_context, make_response
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.pagination import Pagination
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf.csrf import CSRFProtect
-import pandas as pd
-from io import BytesIO, StringIO
+from markupsafe import Markup
+import tempfile
+from io import StringIO
+from decimal import Decimal, InvalidOperation
 import csv
+import codecs
 import os
 from functools import wraps
 from math import ceil
+from sqlalchemy import func, case, select, and_, inspect as sa_inspect, text
+from sqlalchemy.dialects.mysql import match, insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import re
+import base64
+import hashlib
+import hmac
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from cache import SnapshotCache, CacheTTL, CacheArquivos, CacheBytes
+from jobs import GerenciadorJobs
+from agendador import TarefaPeriodica
+from senhas import gerar_hash, verificar_hash, precisa_rehash
+import metricas
+import perfil_sql
+import saude
+import replica
+from replica import SessaoComReplica, leitura_na_replica
+from metricas_pool import QueuePoolMedido, estatisticas_pool
+from formatacao import limpar_telefone, formatar_telefone, formatar_moeda, formatar_data
 
+# Rotas, filtros e comandos são registrados neste objeto; create_app()
+# aplica a configuração e inicializa as extensões.
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'peixoto-grupo-empresarial-2024-secret')
-db_user = os.getenv('MYSQL_USER', 'root')
-db_pass = os.getenv('MYSQL_PASSWORD', 'masterof') # Senha local padrão
-db_host = os.getenv('MYSQL_HOST', 'localhost')    # No K8s será 'mysql.database.svc.cluster.local'
-db_name = os.getenv('MYSQL_DATABASE', 'telecom_assets')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{db_user}:{db_pass}@{db_host}/{db_name}'
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
+# Sessão que sabe ler da réplica (ver replica.py)
+db = SQLAlchemy(session_options={'class_': SessaoComReplica})
+login_manager = LoginManager()
 login_manager.login_view = 'login'
-csrf = CSRFProtect(app)
+csrf = CSRFProtect()
+
+def configuracao_padrao():
+    """Configuração lida das variáveis de ambiente"""
+    db_user = os.getenv('MYSQL_USER', 'root')
+    db_pass = os.getenv('MYSQL_PASSWORD', 'masterof') # Senha local padrão
+    db_host = os.getenv('MYSQL_HOST', 'localhost')    # No K8s será 'mysql.database.svc.cluster.local'
+    db_name = os.getenv('MYSQL_DATABASE', 'telecom_assets')
+    # DB_DRIVER=mysqlclient usa o driver em C (mysqldb) no lugar do PyMySQL
+    driver = 'mysqldb' if os.getenv('DB_DRIVER', 'pymysql') == 'mysqlclient' else 'pymysql'
+    
+    return {
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'peixoto-grupo-empresarial-2024-secret'),
+        # DATABASE_URL permite apontar para outro banco (ex.: SQLite em benchmarks)
+        'SQLALCHEMY_DATABASE_URI': os.getenv(
+            'DATABASE_URL', f'mysql+{driver}://{db_user}:{db_pass}@{db_host}/{db_name}'
+        ),
+        # Tempo (segundos) que o snapshot de estatísticas do dashboard fica em cache
+        'DASHBOARD_CACHE_TTL': int(os.getenv('DASHBOARD_CACHE_TTL', '30')),
+        # Serialização JSON em C quando o orjson estiver instalado
+        'JSON_ORJSON': os.getenv('JSON_ORJSON', '1') == '1',
+        # Perfil de SQL por requisição (desenvolvimento/testes; ver perfil_sql.py)
+        'SQL_PROFILING': os.getenv('SQL_PROFILING', '0') == '1',
+        'SQL_PROFILING_MAX_CONSULTAS': int(os.getenv('SQL_PROFILING_MAX_CONSULTAS', '10')),
+        'SQL_PROFILING_LENTO_MS': int(os.getenv('SQL_PROFILING_LENTO_MS', '200')),
+        # Réplica de leitura opcional (mesmo formato de DATABASE_URL)
+        'DATABASE_REPLICA_URL': os.getenv('DATABASE_REPLICA_URL', ''),
+        # Segundos em que o usuário lê do primário após a própria escrita
+        'REPLICA_JANELA_ESCRITA': int(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', '10')),
+        # Intervalo (segundos) do recálculo em segundo plano dos vencimentos; 0 desliga a thread
+        'VENCIMENTOS_INTERVALO': int(os.getenv('VENCIMENTOS_INTERVALO', '300')),
+    }
+
+def opcoes_engine(uri):
+    """
+    Opções do pool de conexões. Cada worker do gunicorn tem seu próprio pool,
+    dimensionado pelas threads do worker mais as threads de exportação.
+    """
+    if uri.startswith('sqlite'):
+        return {}
+    
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    threads_exportacao = int(os.getenv('EXPORT_WORKERS', '2'))
+    
+    return {
+        'poolclass': QueuePoolMedido,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', str(threads + threads_exportacao))),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '2')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Descarta conexões antes do wait_timeout do MySQL derrubá-las
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        # Testa a conexão no checkout (evita erros de conexão já fechada)
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    }
+
+def create_app(config=None):
+    """
+    Configura e devolve a aplicação. `config` sobrescreve os valores vindos
+    do ambiente (ex.: testes apontando para SQLite). Chamadas repetidas
+    devolvem a mesma instância já inicializada; se trouxerem um `config`
+    diferente do ativo (ex.: outro banco), levantam RuntimeError em vez de
+    ignorá-lo silenciosamente.
+    """
+    if 'sqlalchemy' in app.extensions:
+        diferentes = sorted(
+            chave for chave, valor in (config or {}).items()
+            if app.config.get(chave) != valor
+        )
+        if diferentes:
+            raise RuntimeError(
+                'create_app() já foi chamado com outra configuração '
+                f'({", ".join(diferentes)}); a aplicação é única por processo'
+            )
+        return app
+    
+    app.config.update(configuracao_padrao())
+    if config:
+        app.config.update(config)
+    
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    
+    uri_replica = app.config['DATABASE_REPLICA_URL']
+    if uri_replica:
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds[replica.BIND_REPLICA] = {'url': uri_replica, **opcoes_engine(uri_replica)}
+    
+    db.init_app(app)
+    login_manager.init_app(app)
+    csrf.init_app(app)
+    
+    if app.config['JSON_ORJSON']:
+        try:
+            from json_rapido import OrjsonProvider
+            app.json = OrjsonProvider(app)
+        except ImportError:
+            pass
+    
+    estatisticas_cache.ttl = app.config['DASHBOARD_CACHE_TTL']
+    if app.config['VENCIMENTOS_INTERVALO'] > 0:
+        # O snapshot vale até duas rodadas do agendador (margem para atrasos)
+        vencimentos_cache.ttl = app.config['VENCIMENTOS_INTERVALO'] * 2
+        agendador_vencimentos.intervalo = app.config['VENCIMENTOS_INTERVALO']
+        agendador_vencimentos.iniciar()
+    if uri_replica:
+        agendador_replica.intervalo = saude.PRONTIDAO_CACHE_TTL
+        agendador_replica.iniciar()
+    metricas.registrar(app)
+    perfil_sql.registrar(app)
+    return app
 
 # ========== MODELOS ==========
 class Usuario(db.Model, UserMixin):
@@ -40,14 +167,32 @@ class Usuario(db.Model, UserMixin):
     isAdmin = db.Column(db.Boolean, default=False)
     
     def set_password(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
     
     def check_password(self, senha):
-        return check_password_hash(self.senha_hash, senha)
+        return verificar_hash(self.senha_hash, senha)
+    
+    def precisa_rehash(self):
+        return precisa_rehash(self.senha_hash)
     
     def get_id(self):
         return str(self.id)
 
+class Departamento(db.Model):
+    __tablename__ = 'departamentos'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), unique=True, nullable=False)
+
+class Plano(db.Model):
+    __tablename__ = 'planos'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), unique=True, nullable=False)
+
+class Conta(db.Model):
+    __tablename__ = 'contas'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(30), unique=True, nullable=False)
+
 class Linha(db.Model):
     __tablename__ = 'linhas'
     id = db.Column(db.Integer, primary_key=True)
@@ -63,104 +208,646 @@ class Linha(db.Model):
     status = db.Column(db.Enum('Ativa', 'A Cancelar', 'Cancelada'), nullable=False)
     uso = db.Column(db.Enum('Sim', 'Não'), nullable=False)
     fase = db.Column(db.String(20), default=None)
+    # Chaves das tabelas de apoio (o texto continua nas colunas acima)
+    departamento_id = db.Column(db.Integer, db.ForeignKey('departamentos.id'))
+    plano_id = db.Column(db.Integer, db.ForeignKey('planos.id'))
+    conta_id = db.Column(db.Integer, db.ForeignKey('contas.id'))
+    
+    __table_args__ = (
+        db.Index('ix_linhas_linha', 'linha'),
+        db.Index('ix_linhas_conta', 'conta'),
+        db.Index('ix_linhas_status_termino', 'status', 'termino'),
+        db.Index('ix_linhas_departamento_status', 'departamento', 'status'),
+        db.Index('ix_linhas_termino', 'termino'),
+        db.Index('ix_linhas_departamento_id_status', 'departamento_id', 'status'),
+        db.Index('ix_linhas_plano_id', 'plano_id'),
+        db.Index('ix_linhas_conta_id', 'conta_id'),
+        # Índice FULLTEXT usado pela busca textual (apenas MySQL)
+        db.Index('ft_linhas_busca', 'conta', 'plano', 'responsavel', 'departamento', 'fase',
+                 mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'conta': self.conta,
-            'linha': self.formatar_telefone(self.linha),
-            'linha_raw': self.linha,
-            'plano': self.plano,
-            'mensalidade': float(self.mensalidade),
-            'responsavel': self.responsavel,
-            'departamento': self.departamento,
-            'chipeira': self.chipeira,
-            'efetivacao': self.efetivacao.strftime('%d/%m/%Y') if self.efetivacao else None,
-            'termino': self.termino.strftime('%d/%m/%Y') if self.termino else None,
-            'status': self.status,
-            'uso': self.uso,
-            'fase': self.fase
-        }
+        return serializar_linha((
+            self.id, self.conta, self.linha, self.plano, self.mensalidade,
+            self.responsavel, self.departamento, self.chipeira, self.efetivacao,
+            self.termino, self.status, self.uso, self.fase
+        ))
     
     def formatar_telefone(self, telefone):
         """Formata o telefone para exibição (XX) XXXXX-XXXX"""
-        if not telefone:
-            return ''
-        
-        # Remove caracteres não numéricos
-        numeros = ''.join(filter(str.isdigit, str(telefone)))
-        
-        if len(numeros) == 11:  # Celular com DDD
-            return f'({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}'
-        elif len(numeros) == 10:  # Telefone fixo com DDD
-            return f'({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}'
-        elif len(numeros) == 9:  # Celular sem DDD
-            return f'{numeros[:5]}-{numeros[5:]}'
-        elif len(numeros) == 8:  # Telefone fixo sem DDD
-            return f'{numeros[:4]}-{numeros[4:]}'
-        else:
-            return telefone
+        return formatar_telefone(telefone)
+
+class CustoMensal(db.Model):
+    """Rollup de custo por mês/departamento/conta/status (mantido incrementalmente)"""
+    __tablename__ = 'custos_mensais'
+    mes = db.Column(db.Date, primary_key=True)  # Sempre o dia 1 do mês
+    departamento = db.Column(db.String(100), primary_key=True)
+    conta = db.Column(db.String(30), primary_key=True)
+    status = db.Column(db.Enum('Ativa', 'A Cancelar', 'Cancelada'), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    custo_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class VersaoTabela(db.Model):
+    """Contador incrementado a cada escrita na tabela (base dos ETags)"""
+    __tablename__ = 'versoes_tabelas'
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime)  # UTC
+
+# Projeção de colunas usada pela API e pelas exportações (tuplas, sem ORM)
+COLUNAS_LINHA = (
+    Linha.id, Linha.conta, Linha.linha, Linha.plano, Linha.mensalidade,
+    Linha.responsavel, Linha.departamento, Linha.chipeira, Linha.efetivacao,
+    Linha.termino, Linha.status, Linha.uso, Linha.fase
+)
+
+def serializar_linha(row):
+    """Converte uma tupla na ordem de COLUNAS_LINHA no dicionário da API"""
+    (id_, conta, linha, plano, mensalidade, responsavel, departamento,
+     chipeira, efetivacao, termino, status, uso, fase) = row
+    return {
+        'id': id_,
+        'conta': conta,
+        'linha': formatar_telefone(linha),
+        'linha_raw': linha,
+        'plano': plano,
+        'mensalidade': float(mensalidade),
+        'responsavel': responsavel,
+        'departamento': departamento,
+        'chipeira': chipeira,
+        'efetivacao': formatar_data(efetivacao, vazio=None),
+        'termino': formatar_data(termino, vazio=None),
+        'status': status,
+        'uso': uso,
+        'fase': fase
+    }
 
 # ========== FUNÇÕES AUXILIARES ==========
-def formatar_telefone_para_exibicao(telefone):
-    """Função auxiliar para formatar telefone para exibição"""
-    if not telefone:
-        return ''
-    
-    # Remove caracteres não numéricos
-    numeros = ''.join(filter(str.isdigit, str(telefone)))
-    
-    if len(numeros) == 11:  # Celular com DDD
-        return f'({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}'
-    elif len(numeros) == 10:  # Telefone fixo com DDD
-        return f'({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}'
-    elif len(numeros) == 9:  # Celular sem DDD
-        return f'{numeros[:5]}-{numeros[5:]}'
-    elif len(numeros) == 8:  # Telefone fixo sem DDD
-        return f'{numeros[:4]}-{numeros[4:]}'
-    else:
-        return telefone
+# Implementações compartilhadas em formatacao.py (nomes mantidos por compatibilidade)
+formatar_telefone_para_exibicao = formatar_telefone
+formatar_moeda_br = formatar_moeda
+
+STATUS_LINHA = ('Ativa', 'A Cancelar', 'Cancelada')
+
+def comando_upsert(tabela, atualizar):
+    """
+    INSERT que atualiza o registro quando a chave primária já existe.
+    `atualizar(novo)` recebe os valores do registro enviado e devolve o SET.
+    """
+    dialeto = db.engine.dialect.name
+    if dialeto == 'mysql':
+        stmt = mysql_insert(tabela)
+        return stmt.on_duplicate_key_update(atualizar(stmt.inserted))
+    if dialeto == 'sqlite':
+        stmt = sqlite_insert(tabela)
+        return stmt.on_conflict_do_update(
+            index_elements=list(tabela.primary_key.columns),
+            set_=atualizar(stmt.excluded)
+        )
+    raise RuntimeError(f'Upsert não suportado para o banco {dialeto}')
+
+def comando_insert_ignorando(tabela):
+    """INSERT que ignora registros que violariam uma chave única"""
+    dialeto = db.engine.dialect.name
+    if dialeto == 'mysql':
+        return mysql_insert(tabela).prefix_with('IGNORE')
+    if dialeto == 'sqlite':
+        return sqlite_insert(tabela).on_conflict_do_nothing()
+    raise RuntimeError(f'Insert ignorando duplicados não suportado para o banco {dialeto}')
+
+# ========== TABELAS DE APOIO (LOOKUPS) ==========
+# Departamento, plano e conta normalizados em tabelas próprias. As colunas de
+# texto de Linha continuam existindo (API, busca e exportações); agregações
+# usam as chaves inteiras.
+LOOKUPS_LINHA = {
+    'departamento': (Departamento, 'departamento_id'),
+    'plano': (Plano, 'plano_id'),
+    'conta': (Conta, 'conta_id'),
+}
+
+lookups_cache = SnapshotCache(ttl=int(os.getenv('LOOKUP_CACHE_TTL', '300')))
+
+def carregar_lookups():
+    """{campo: {id: nome}} de cada tabela de apoio, em ordem alfabética"""
+    return {
+        campo: dict(db.session.execute(select(modelo.id, modelo.nome).order_by(modelo.nome)).all())
+        for campo, (modelo, _) in LOOKUPS_LINHA.items()
+    }
+
+def obter_lookups():
+    return lookups_cache.obter(carregar_lookups)
 
-def limpar_telefone(telefone_formatado):
-    """Remove formatação do telefone, deixando apenas números"""
-    if not telefone_formatado:
-        return ''
-    return ''.join(filter(str.isdigit, str(telefone_formatado)))
+def nome_lookup(campo, id_):
+    nomes = obter_lookups()[campo]
+    if id_ not in nomes:
+        # Criado em outro worker depois do último carregamento
+        nomes = lookups_cache.atualizar(carregar_lookups)[campo]
+    return nomes.get(id_)
 
-def formatar_moeda_br(valor):
-    """Formata valores monetários no formato brasileiro (R$ 48,08)"""
+def ids_lookup(campo, nomes):
+    """{nome: id} para os nomes informados, criando os que ainda não existirem"""
+    modelo, _ = LOOKUPS_LINHA[campo]
+    por_nome = {nome: id_ for id_, nome in obter_lookups()[campo].items()}
+    
+    ids = {}
+    faltantes = []
+    for nome in set(nomes):
+        if nome in por_nome:
+            ids[nome] = por_nome[nome]
+        else:
+            faltantes.append(nome)
+    
+    if faltantes:
+        db.session.execute(comando_insert_ignorando(modelo.__table__), [{'nome': nome} for nome in faltantes])
+        for nome in faltantes:
+            # Consulta individual: respeita a collation do banco (ex.: 'ti' = 'TI' no MySQL)
+            ids[nome] = db.session.execute(select(modelo.id).where(modelo.nome == nome)).scalar_one()
+        lookups_cache.invalidar()
+    return ids
+
+def preencher_ids_lookup(registros):
+    """Completa departamento_id/plano_id/conta_id em dicionários de linhas"""
+    for campo, (_, coluna) in LOOKUPS_LINHA.items():
+        nomes = [registro[campo] for registro in registros if campo in registro]
+        if not nomes:
+            continue
+        ids = ids_lookup(campo, nomes)
+        for registro in registros:
+            if campo in registro:
+                registro[coluna] = ids[registro[campo]]
+
+def aplicar_ids_lookup(linha):
+    """Atualiza as chaves de apoio de um objeto Linha a partir dos textos"""
+    for campo, (_, coluna) in LOOKUPS_LINHA.items():
+        nome = getattr(linha, campo)
+        setattr(linha, coluna, ids_lookup(campo, [nome])[nome])
+
+def preencher_lookups(conn):
+    """
+    Copia para as tabelas de apoio os textos ainda não cadastrados e preenche
+    as chaves nulas de linhas (em SQL, sem carregar as linhas). Idempotente.
+    """
+    tabela = Linha.__table__
+    preenchidas = 0
+    for campo, (modelo, coluna) in LOOKUPS_LINHA.items():
+        texto = tabela.c[campo]
+        conn.execute(modelo.__table__.insert().from_select(
+            ['nome'],
+            select(texto).distinct().where(texto.not_in(select(modelo.nome)))
+        ))
+        resultado = conn.execute(
+            tabela.update()
+            .where(tabela.c[coluna].is_(None))
+            .values({coluna: select(modelo.id).where(modelo.nome == texto).scalar_subquery()})
+        )
+        preenchidas += resultado.rowcount
+    return preenchidas
+
+def migrar_lookups():
+    """
+    Migração das tabelas de apoio em bancos existentes: cria as colunas
+    *_id em linhas, os índices, as FKs (MySQL) e faz o backfill.
+    """
+    dialeto = db.engine.dialect.name
+    inspetor = sa_inspect(db.engine)
+    existentes = {coluna['name'] for coluna in inspetor.get_columns('linhas')}
+    
+    with db.engine.begin() as conn:
+        for campo, (modelo, coluna) in LOOKUPS_LINHA.items():
+            if coluna in existentes:
+                continue
+            referencia = '' if dialeto == 'mysql' else f' REFERENCES {modelo.__tablename__} (id)'
+            conn.execute(text(f'ALTER TABLE linhas ADD COLUMN {coluna} INTEGER NULL{referencia}'))
+    
+    for indice in Linha.__table__.indexes:
+        indice.create(db.engine, checkfirst=True)
+    
+    if dialeto == 'mysql':
+        # Depois dos índices, para o MySQL reaproveitá-los em vez de criar outros
+        fks = {tuple(fk['constrained_columns']) for fk in sa_inspect(db.engine).get_foreign_keys('linhas')}
+        with db.engine.begin() as conn:
+            for campo, (modelo, coluna) in LOOKUPS_LINHA.items():
+                if (coluna,) not in fks:
+                    conn.execute(text(
+                        f'ALTER TABLE linhas ADD CONSTRAINT fk_linhas_{coluna} '
+                        f'FOREIGN KEY ({coluna}) REFERENCES {modelo.__tablename__} (id)'
+                    ))
+    
+    with db.engine.begin() as conn:
+        preenchidas = preencher_lookups(conn)
+    lookups_cache.invalidar()
+    return preenchidas
+
+# ========== BUSCA ==========
+# Caracteres de formatação ignorados quando o termo é um número de telefone/conta
+RE_NUMERICO = re.compile(r'^[\d\s()\-.+]+$')
+# Operadores do modo booleano do FULLTEXT que não podem vir do usuário
+RE_OPERADORES_FULLTEXT = re.compile(r'[+\-<>()~*"@]')
+# innodb_ft_min_token_size padrão: palavras menores não entram no índice
+FULLTEXT_TAMANHO_MINIMO = 3
+
+def filtro_busca_like(termo):
+    """Busca original: LIKE '%termo%' em todas as colunas textuais"""
+    search_filter = f'%{termo}%'
+    return db.or_(
+        Linha.conta.like(search_filter),
+        Linha.linha.like(search_filter),
+        Linha.plano.like(search_filter),
+        Linha.responsavel.like(search_filter),
+        Linha.departamento.like(search_filter),
+        Linha.status.like(search_filter),
+        Linha.fase.like(search_filter)
+    )
+
+def filtro_busca(termo, dialeto):
+    """
+    Monta o filtro de busca escolhendo o plano mais barato para o termo:
+    - apenas dígitos: busca por prefixo em linha/conta (usa índice)
+    - nome de status: igualdade no status
+    - texto livre: MATCH ... AGAINST no MySQL, LIKE nos demais bancos
+    O MATCH só é usado quando todas as palavras entram no índice; com uma
+    palavra curta ela seria ignorada e o filtro ficaria mais amplo que o
+    termo (perigoso nas operações em lote), então vale o LIKE no termo inteiro.
+    Retorna None quando não há termo.
+    """
+    termo = (termo or '').strip()
+    if not termo:
+        return None
+
+    if RE_NUMERICO.match(termo):
+        digitos = limpar_telefone(termo)
+        if digitos:
+            prefixo = f'{digitos}%'
+            return db.or_(Linha.linha.like(prefixo), Linha.conta.like(prefixo))
+
+    for status in STATUS_LINHA:
+        if termo.lower() == status.lower():
+            return Linha.status == status
+
+    if dialeto == 'mysql':
+        palavras = RE_OPERADORES_FULLTEXT.sub(' ', termo).split()
+        if palavras and all(len(p) >= FULLTEXT_TAMANHO_MINIMO for p in palavras):
+            expressao = ' '.join(f'+{p}*' for p in palavras)
+            return match(
+                Linha.conta, Linha.plano, Linha.responsavel, Linha.departamento, Linha.fase,
+                against=expressao
+            ).in_boolean_mode()
+
+    return filtro_busca_like(termo)
+
+def aplicar_busca(query, termo):
+    """Aplica o filtro de busca à query de linhas"""
+    filtro = filtro_busca(termo, db.engine.dialect.name)
+    if filtro is None:
+        return query
+    return query.filter(filtro)
+
+# ========== PAGINAÇÃO POR CURSOR ==========
+def codificar_cursor(linha_id):
+    """Gera o cursor opaco que aponta para depois da linha informada"""
+    return base64.urlsafe_b64encode(f'id:{linha_id}'.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor):
+    """Retorna o id contido no cursor (ValueError se for inválido)"""
     try:
-        if valor is None:
-            return '0,00'
-        
-        # Converter para float
-        if isinstance(valor, str):
-            valor = float(valor.replace(',', '.'))
-        elif not isinstance(valor, (int, float)):
-            valor = float(valor)
-        
-        # Formatar com 2 casas decimais e vírgula como separador decimal
-        formatted = f"{valor:,.2f}"
-        
-        # Substituir ponto por vírgula para separador decimal
-        # e vírgula por ponto para separador de milhar
-        if '.' in formatted and ',' in formatted:
-            # Tem separador de milhar e decimal (ex: 1,000.50)
-            return formatted.replace(',', 'X').replace('.', ',').replace('X', '.')
-        elif '.' in formatted:
-            # Apenas separador decimal (ex: 48.08)
-            return formatted.replace('.', ',')
+        preenchimento = '=' * (-len(cursor) % 4)
+        conteudo = base64.urlsafe_b64decode(cursor + preenchimento).decode()
+        prefixo, linha_id = conteudo.split(':', 1)
+        if prefixo != 'id':
+            raise ValueError
+        return int(linha_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor inválido') from e
+
+# ========== VERSÃO DA TABELA (CONDITIONAL GET) ==========
+# Cada escrita em linhas incrementa o contador na mesma transação; as
+# respostas de leitura usam a versão no ETag e devolvem 304 quando o
+# cliente já tem a versão atual (vale entre workers e pods).
+
+def incrementar_versao_linhas():
+    """Chamar antes do commit de qualquer escrita em linhas"""
+    tabela = VersaoTabela.__table__
+    stmt = comando_upsert(tabela, lambda novo: {
+        'versao': tabela.c.versao + 1,
+        'atualizado_em': novo.atualizado_em,
+    })
+    db.session.execute(stmt, [{'tabela': 'linhas', 'versao': 1, 'atualizado_em': datetime.utcnow()}])
+
+def versao_linhas():
+    """(versao, atualizado_em) atuais da tabela de linhas (consulta pela PK)"""
+    row = db.session.execute(
+        select(VersaoTabela.versao, VersaoTabela.atualizado_em).where(VersaoTabela.tabela == 'linhas')
+    ).first()
+    return (row.versao, row.atualizado_em) if row else (0, None)
+
+def versao_requisicao(versao=None):
+    """ETag da URL atual (endpoint + parâmetros) na versão informada ou atual"""
+    numero, atualizado_em = versao or versao_linhas()
+    parametros = (request.endpoint, sorted(request.args.items(multi=True)))
+    resumo = hashlib.sha1(repr(parametros).encode('utf-8')).hexdigest()[:16]
+    return f'{numero}-{resumo}', atualizado_em
+
+def nao_modificado(versao):
+    """True quando o cliente já tem esta versão (If-None-Match ou If-Modified-Since)"""
+    etag, atualizado_em = versao
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and atualizado_em:
+        return atualizado_em.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+def aplicar_versao(resposta, versao):
+    etag, atualizado_em = versao
+    resposta.set_etag(etag)
+    if atualizado_em:
+        resposta.last_modified = atualizado_em.replace(tzinfo=timezone.utc)
+    # O navegador pode guardar, mas sempre revalida
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def resposta_nao_modificada(versao):
+    return aplicar_versao(Response(status=304), versao)
+
+# ========== ESTATÍSTICAS (CACHE) ==========
+estatisticas_cache = SnapshotCache(ttl=30)
+
+def calcular_estatisticas():
+    """Calcula todos os contadores do dashboard em uma única consulta"""
+    # Lida antes da agregação: uma escrita no meio deixa o snapshot "atrasado", nunca adiantado
+    versao = versao_linhas()[0]
+    # Agrupa pela chave inteira; linhas ainda sem chave (antes do backfill) agrupam pelo texto
+    colunas = [
+        Linha.departamento_id,
+        case((Linha.departamento_id.is_(None), Linha.departamento)).label('departamento_texto'),
+        func.count(Linha.id).label('total'),
+        func.sum(Linha.mensalidade).label('custo_total'),
+    ]
+    for i, status in enumerate(STATUS_LINHA):
+        colunas.append(func.sum(case((Linha.status == status, 1), else_=0)).label(f'qtd_{i}'))
+        colunas.append(func.sum(case((Linha.status == status, Linha.mensalidade), else_=0)).label(f'custo_{i}'))
+
+    linhas_agrupadas = db.session.query(*colunas).group_by(colunas[0], colunas[1]).all()
+
+    total_linhas = 0
+    custo_total = 0.0
+    qtd_status = [0] * len(STATUS_LINHA)
+    custo_status = [0.0] * len(STATUS_LINHA)
+    departamentos = []
+
+    for row in linhas_agrupadas:
+        custo_dept = float(row.custo_total or 0)
+        total_linhas += row.total
+        custo_total += custo_dept
+        for i in range(len(STATUS_LINHA)):
+            qtd_status[i] += int(getattr(row, f'qtd_{i}') or 0)
+            custo_status[i] += float(getattr(row, f'custo_{i}') or 0)
+        if row.departamento_id is not None:
+            departamento = nome_lookup('departamento', row.departamento_id)
         else:
-            # Número inteiro (ex: 48)
-            return f"{valor},00"
-    except (ValueError, TypeError) as e:
-        print(f"Erro ao formatar moeda: {e}, valor: {value}")
-        return '0,00'
+            departamento = row.departamento_texto
+        departamentos.append({
+            'departamento': departamento,
+            'total': row.total,
+            'custo_total': custo_dept
+        })
+
+    departamentos.sort(key=lambda d: d['total'], reverse=True)
+
+    # Mesmo formato do antigo GROUP BY status (apenas status presentes)
+    status_linhas = [
+        {'status': status, 'total': qtd_status[i]}
+        for i, status in enumerate(STATUS_LINHA) if qtd_status[i]
+    ]
+
+    resumo = {
+        'total_linhas': total_linhas,
+        'linhas_ativas': qtd_status[0],
+        'linhas_a_cancelar': qtd_status[1],
+        'linhas_canceladas': qtd_status[2],
+        'custo_mensal_total': custo_total,
+        'media_mensalidade': custo_total / total_linhas if total_linhas else 0.0,
+        'custo_linhas_ativas': custo_status[0],
+        'custo_linhas_a_cancelar': custo_status[1],
+        'custo_linhas_canceladas': custo_status[2],
+    }
+
+    return {
+        'versao': versao,
+        'resumo': resumo,
+        'departamentos': departamentos,
+        'status_linhas': status_linhas
+    }
+
+def obter_estatisticas(versao=None):
+    """
+    Retorna o snapshot de estatísticas (recalcula apenas após o TTL ou
+    invalidação). Com `versao`, recalcula também se o snapshot for de uma
+    versão anterior da tabela (escrita feita em outro worker). Só avança:
+    uma réplica atrasada não substitui um snapshot mais novo do primário.
+    """
+    estatisticas = estatisticas_cache.obter(calcular_estatisticas)
+    if versao is not None and estatisticas['versao'] < versao:
+        estatisticas = estatisticas_cache.atualizar(calcular_estatisticas)
+    return estatisticas
+
+def invalidar_estatisticas():
+    """Descarta o snapshot após qualquer alteração em linhas"""
+    estatisticas_cache.invalidar()
+
+def linhas_alteradas():
+    """Chamar após o commit de qualquer alteração em linhas"""
+    invalidar_estatisticas()
+    invalidar_vencimentos()
+    # As próximas leituras deste usuário vão ao primário (read-your-writes)
+    replica.registrar_escrita()
+
+# ========== VENCIMENTOS DE CONTRATO ==========
+# Linhas ativas com término nos próximos 30/60/90 dias (ou já vencido).
+# Consulta coberta pelo índice ix_linhas_status_termino (status, termino).
+FAIXAS_VENCIMENTO = (30, 60, 90)
+# Linhas listadas por faixa no snapshot (os totais consideram todas)
+VENCIMENTOS_MAX_LINHAS = int(os.getenv('VENCIMENTOS_MAX_LINHAS', '500'))
+
+vencimentos_cache = SnapshotCache(ttl=300)
+
+def calcular_vencimentos(hoje=None):
+    """Agrupa as linhas ativas por faixa de vencimento (uma consulta, ordenada pelo término)"""
+    hoje = hoje or date.today()
+    limite = hoje + timedelta(days=FAIXAS_VENCIMENTO[-1])
+    
+    # Faixas disjuntas: 'de'..'dias' dias até o término (inclusive)
+    faixas = [{'faixa': 'vencidas', 'de': None, 'dias': -1, 'total': 0, 'custo_total': 0.0, 'linhas': []}]
+    for de, dias in zip((0,) + tuple(d + 1 for d in FAIXAS_VENCIMENTO), FAIXAS_VENCIMENTO):
+        faixas.append({'faixa': str(dias), 'de': de, 'dias': dias, 'total': 0, 'custo_total': 0.0, 'linhas': []})
+    
+    stmt = (
+        select(*COLUNAS_LINHA)
+        .where(Linha.status == 'Ativa', Linha.termino <= limite)
+        .order_by(Linha.termino, Linha.id)
+    )
+    for row in db.session.execute(stmt):
+        dias_restantes = (row.termino - hoje).days
+        if dias_restantes < 0:
+            faixa = faixas[0]
+        else:
+            faixa = next(f for f in faixas[1:] if dias_restantes <= f['dias'])
+        faixa['total'] += 1
+        faixa['custo_total'] += float(row.mensalidade)
+        if len(faixa['linhas']) < VENCIMENTOS_MAX_LINHAS:
+            linha = serializar_linha(row)
+            linha['dias_restantes'] = dias_restantes
+            faixa['linhas'].append(linha)
+    
+    for faixa in faixas:
+        faixa['custo_total'] = round(faixa['custo_total'], 2)
+    
+    return {
+        'referencia': hoje.isoformat(),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'faixas': faixas
+    }
+
+def obter_vencimentos():
+    """Snapshot dos vencimentos (normalmente já calculado pelo agendador)"""
+    vencimentos = vencimentos_cache.obter(calcular_vencimentos)
+    if vencimentos['referencia'] != date.today().isoformat():
+        # Virada do dia: as faixas mudam mesmo sem alterações nas linhas
+        vencimentos = vencimentos_cache.atualizar(calcular_vencimentos)
+    return vencimentos
+
+def invalidar_vencimentos():
+    vencimentos_cache.invalidar()
+    agendador_vencimentos.executar_agora()
+
+def _atualizar_vencimentos():
+    with app.app_context():
+        vencimentos_cache.atualizar(calcular_vencimentos)
+
+agendador_vencimentos = TarefaPeriodica('vencimentos', 300, _atualizar_vencimentos)
+
+# ========== CUSTOS MENSAIS (ROLLUP) ==========
+# Uma linha conta em todos os meses entre a efetivação e o término (inclusive)
+
+def primeiro_dia_mes(data):
+    return data.replace(day=1)
+
+def somar_meses(data, meses):
+    total = data.year * 12 + data.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def meses_entre(inicio, fim):
+    """Primeiro dia de cada mês entre as duas datas (inclusive)"""
+    mes = primeiro_dia_mes(inicio)
+    ultimo = primeiro_dia_mes(fim)
+    while mes <= ultimo:
+        yield mes
+        mes = somar_meses(mes, 1)
+
+# Campos de uma linha que afetam o rollup
+CAMPOS_CUSTOS = ('departamento', 'conta', 'status', 'mensalidade', 'efetivacao', 'termino')
+
+def contribuicao_custos_valores(valores):
+    return (valores['departamento'], valores['conta'], valores['status'],
+            Decimal(str(valores['mensalidade'])), valores['efetivacao'], valores['termino'])
+
+def contribuicao_custos(linha):
+    """Dados de uma linha que afetam o rollup (capturar antes de editar)"""
+    return contribuicao_custos_valores({campo: getattr(linha, campo) for campo in CAMPOS_CUSTOS})
+
+def acumular_custos(deltas, contribuicao, sinal):
+    departamento, conta, status, mensalidade, efetivacao, termino = contribuicao
+    if not efetivacao or not termino:
+        return
+    for mes in meses_entre(efetivacao, termino):
+        chave = (mes, departamento, conta, status)
+        quantidade, custo = deltas.get(chave, (0, Decimal('0')))
+        deltas[chave] = (quantidade + sinal, custo + sinal * mensalidade)
+
+def aplicar_deltas_custos(deltas):
+    """Soma os deltas no rollup (na transação corrente; o commit é de quem chama)"""
+    registros = [
+        {'mes': mes, 'departamento': departamento, 'conta': conta, 'status': status,
+         'quantidade': quantidade, 'custo_total': custo}
+        for (mes, departamento, conta, status), (quantidade, custo) in deltas.items()
+        if quantidade or custo
+    ]
+    if not registros:
+        return
+    
+    tabela = CustoMensal.__table__
+    stmt = comando_upsert(tabela, lambda novo: {
+        'quantidade': tabela.c.quantidade + novo.quantidade,
+        'custo_total': tabela.c.custo_total + novo.custo_total,
+    })
+    db.session.execute(stmt, registros)
+    
+    # Remove grupos que ficaram vazios
+    meses = {r['mes'] for r in registros}
+    db.session.execute(tabela.delete().where(tabela.c.mes.in_(meses), tabela.c.quantidade <= 0))
+
+def atualizar_custos_mensais(antes=None, depois=None):
+    """
+    Ajusta o rollup para uma linha criada (depois), excluída (antes) ou
+    editada (antes e depois). `antes`/`depois` vêm de contribuicao_custos().
+    """
+    deltas = {}
+    if antes:
+        acumular_custos(deltas, antes, -1)
+    if depois:
+        acumular_custos(deltas, depois, 1)
+    aplicar_deltas_custos(deltas)
+
+def reconstruir_custos_mensais(lote=5000):
+    """Recalcula todo o rollup a partir da tabela de linhas"""
+    acumulado = {}
+    stmt = select(
+        Linha.departamento, Linha.conta, Linha.status,
+        Linha.mensalidade, Linha.efetivacao, Linha.termino
+    ).execution_options(stream_results=True, yield_per=lote)
+    for row in db.session.execute(stmt):
+        acumular_custos(acumulado, (row[0], row[1], row[2], Decimal(str(row[3])), row[4], row[5]), 1)
+    
+    tabela = CustoMensal.__table__
+    db.session.execute(tabela.delete())
+    registros = [
+        {'mes': mes, 'departamento': departamento, 'conta': conta, 'status': status,
+         'quantidade': quantidade, 'custo_total': custo}
+        for (mes, departamento, conta, status), (quantidade, custo) in acumulado.items()
+    ]
+    for inicio in range(0, len(registros), lote):
+        db.session.execute(tabela.insert(), registros[inicio:inicio + lote])
+    db.session.commit()
+    return len(registros)
 
 # ========== AUTENTICAÇÃO ==========
+# Usuários carregados ficam em cache (desanexados da sessão) por alguns
+# segundos; alterações de status levam no máximo USER_CACHE_TTL para valer
+# nos demais workers (no worker que fez a alteração, valem na hora).
+usuarios_cache = CacheTTL(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', '1024')),
+    ttl=int(os.getenv('USER_CACHE_TTL', '60'))
+)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    user_id = int(user_id)
+    usuario = usuarios_cache.obter(user_id)
+    if usuario is None:
+        usuario = db.session.get(Usuario, user_id)
+        if usuario is None:
+            return None
+        # Desanexa para que commits de outras requisições não expirem o objeto
+        db.session.expunge(usuario)
+        usuarios_cache.definir(user_id, usuario)
+    
+    # Usuário inativado perde a sessão
+    if usuario.status != 'Ativo':
+        return None
+    return usuario
+
+def invalidar_usuario(user_id):
+    usuarios_cache.invalidar(user_id)
 
 def admin_required(f):
     @wraps(f)
@@ -171,31 +858,29 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def acesso_interno(f):
+    """
+    Endpoints internos (métricas): exigem o token METRICS_TOKEN no header
+    Authorization: Bearer, ou, sem token configurado, um administrador logado.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = os.getenv('METRICS_TOKEN')
+        if token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return jsonify({'success': False, 'error': 'Não autorizado'}), 401
+        elif not (current_user.is_authenticated and current_user.isAdmin):
+            return jsonify({'success': False, 'error': 'Não autorizado'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 # ========== FILTROS DE TEMPLATE ==========
 @app.template_filter('format_date')
 def format_date(value, format='%d/%m/%Y'):
     """
     Filtro para formatar datas no formato brasileiro
     """
-    if value is None:
-        return '-'
-    
-    # Se for string, tenta converter para datetime
-    if isinstance(value, str):
-        # Tenta diferentes formatos de entrada
-        for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S'):
-            try:
-                value = datetime.strptime(value, fmt)
-                break
-            except ValueError:
-                continue
-    
-    # Se já for datetime/date, formata
-    if isinstance(value, (datetime, date)):
-        return value.strftime(format)
-    
-    # Se não conseguir formatar, retorna o valor original
-    return str(value)
+    return formatar_data(value, format)
 
 @app.template_filter('format_phone')
 def format_phone(value):
@@ -204,7 +889,7 @@ def format_phone(value):
     Entrada: 16981451024
     Saída: (16) 98145-1024
     """
-    return formatar_telefone_para_exibicao(value)
+    return formatar_telefone(value)
 
 @app.template_filter('format_currency')
 def format_currency(value):
@@ -213,38 +898,7 @@ def format_currency(value):
     Entrada: 48.08
     Saída: 48,08
     """
-    try:
-        if value is None:
-            return '0,00'
-        
-        # Converter para float
-        if isinstance(value, str):
-            # Remove R$, espaços e converte vírgula para ponto
-            clean_value = value.replace('R$', '').replace(' ', '').strip()
-            if clean_value == '':
-                return '0,00'
-            # Substitui vírgula por ponto para conversão
-            value = float(clean_value.replace(',', '.'))
-        elif not isinstance(value, (int, float)):
-            value = float(value)
-        
-        # Formatar com 2 casas decimais
-        formatted = f"{value:,.2f}"
-        
-        # Substituir ponto por vírgula para separador decimal
-        # e vírgula por ponto para separador de milhar
-        if '.' in formatted and ',' in formatted:
-            # Tem separador de milhar e decimal (ex: 1,000.50)
-            return formatted.replace(',', 'X').replace('.', ',').replace('X', '.')
-        elif '.' in formatted:
-            # Apenas separador decimal (ex: 48.08)
-            return formatted.replace('.', ',')
-        else:
-            # Número inteiro (ex: 48)
-            return f"{value},00"
-    except (ValueError, TypeError) as e:
-        print(f"Erro ao formatar moeda: {e}, valor: {value}")
-        return '0,00'
+    return formatar_moeda(value)
 
 # ========== CONTEXTO GLOBAL ==========
 @app.context_processor
@@ -266,6 +920,11 @@ def init_db():
         # Criar todas as tabelas
         db.create_all()
         
+        # Tabelas de apoio: colunas *_id, índices que faltem e backfill
+        preenchidas = migrar_lookups()
+        if preenchidas:
+            print(f"✅ Chaves de departamento/plano/conta preenchidas: {preenchidas}")
+        
         # Verificar se já existe usuário admin
         if not Usuario.query.filter_by(nome='admin').first():
             admin = Usuario(
@@ -278,6 +937,11 @@ def init_db():
             db.session.commit()
             print("✅ Usuário admin criado: admin / admin123")
         
+        # Preencher o rollup de custos na primeira execução
+        if not CustoMensal.query.first() and Linha.query.first():
+            grupos = reconstruir_custos_mensais()
+            print(f"✅ Custos mensais calculados: {grupos} grupos")
+        
         print("✅ Banco inicializado com sucesso!")
         return True
         
@@ -295,9 +959,23 @@ def login():
         
         usuario = Usuario.query.filter_by(nome=nome).first()
         
+        try:
+            senha_ok = usuario is not None and usuario.check_password(senha)
+        except FuturesTimeoutError:
+            flash('Servidor ocupado, tente novamente em instantes', 'error')
+            return render_template('login.html')
+        
         if usuario:
-            if usuario.check_password(senha):
+            if senha_ok:
                 if usuario.status == 'Ativo':
+                    # Atualiza hashes gerados com método/custo antigo
+                    if usuario.precisa_rehash():
+                        try:
+                            usuario.set_password(senha)
+                            db.session.commit()
+                            invalidar_usuario(usuario.id)
+                        except Exception:
+                            db.session.rollback()
                     login_user(usuario)
                     flash('Login realizado com sucesso!', 'success')
                     return redirect(url_for('dashboard'))
@@ -323,54 +1001,22 @@ def index():
 # ========== DASHBOARD ==========
 @app.route('/dashboard')
 @login_required
+@leitura_na_replica
 def dashboard():
     try:
         hoje = date.today()
         
-        # Consultas otimizadas com SQLAlchemy
-        total_linhas = Linha.query.count()
-        
-        # Cálculos agregados
-        from sqlalchemy import func
-        
-        resultados = db.session.query(
-            func.count(Linha.id).label('total'),
-            func.sum(Linha.mensalidade).label('custo_total'),
-            func.avg(Linha.mensalidade).label('media_mensalidade')
-        ).first()
-        
-        # Estatísticas por status
-        ativas = Linha.query.filter_by(status='Ativa').count()
-        a_cancelar = Linha.query.filter_by(status='A Cancelar').count()
-        canceladas = Linha.query.filter_by(status='Cancelada').count()
-        
-        # Distribuição por departamento
-        departamentos_data = db.session.query(
-            Linha.departamento,
-            func.count(Linha.id).label('total'),
-            func.sum(Linha.mensalidade).label('custo_total')
-        ).group_by(Linha.departamento).order_by(func.count(Linha.id).desc()).all()
-        
-        # Status das linhas
-        status_data = db.session.query(
-            Linha.status,
-            func.count(Linha.id).label('total')
-        ).group_by(Linha.status).all()
-        
-        # Resumo COMPLETO
-        resumo = {
-            'total_linhas': total_linhas,
-            'linhas_ativas': ativas,
-            'linhas_a_cancelar': a_cancelar,
-            'linhas_canceladas': canceladas,
-            'custo_mensal_total': float(resultados.custo_total or 0),
-            'media_mensalidade': float(resultados.media_mensalidade or 0),
-        }
+        # Snapshot único (uma consulta agregada, reaproveitada entre requisições),
+        # recalculado se outro worker gravou depois dele
+        estatisticas = obter_estatisticas(versao_linhas()[0])
+        # Faixas de vencimento pré-calculadas em segundo plano
+        vencimentos = obter_vencimentos()
         
         return render_template('dashboard.html',
-                             resumo=resumo,
-                             departamentos=departamentos_data,
-                             status_linhas=status_data,
+                             resumo=estatisticas['resumo'],
+                             departamentos=estatisticas['departamentos'],
+                             status_linhas=estatisticas['status_linhas'],
+                             vencimentos=vencimentos['faixas'],
                              hoje=hoje)
         
     except Exception as e:
@@ -378,40 +1024,86 @@ def dashboard():
         return redirect(url_for('login'))
 
 # ========== GERENCIAR LINHAS COM PAGINAÇÃO ==========
+# Corpo da tabela (<tbody>) já renderizado, por página, busca e versão da tabela.
+# Enquanto a tabela não muda, a página sai da memória sem consultar as linhas.
+fragmentos_linhas = CacheBytes(
+    maxsize=int(os.getenv('LINHAS_FRAGMENT_CACHE_SIZE', '256')),
+    max_bytes=int(os.getenv('LINHAS_FRAGMENT_CACHE_BYTES', str(16 * 1024 * 1024)))
+)
+
+class PaginacaoEmCache(Pagination):
+    """Paginação montada com os números guardados junto ao fragmento (sem consultas)"""
+
+    def _query_items(self):
+        return []
+
+    def _query_count(self):
+        return self._query_args['total']
+
+    @property
+    def first(self):
+        if not self._query_args['quantidade']:
+            return 0
+        return (self.page - 1) * self.per_page + 1
+
+    @property
+    def last(self):
+        first = self.first
+        return max(first, first + self._query_args['quantidade'] - 1)
+
+def paginacao_fragmento(page, per_page, fragmento):
+    """
+    Mesmas regras do query.paginate() usado ao renderizar o fragmento
+    (max_per_page=None, error_out=False); o padrão da classe limitaria a 100.
+    """
+    return PaginacaoEmCache(page=page, per_page=per_page, max_per_page=None, error_out=False,
+                            total=fragmento['total'], quantidade=fragmento['quantidade'])
+
+def chave_fragmento_linhas(page, per_page, search, versao):
+    """Inclui o banco de origem: bancos diferentes repetem os números de versão"""
+    return (page, per_page, search, versao[0], app.config['SQLALCHEMY_DATABASE_URI'])
+
+def renderizar_fragmento_linhas(page, per_page, search):
+    """Consulta a página e renderiza o <tbody>: {'html', 'quantidade', 'total'}"""
+    query = Linha.query
+    
+    # Aplicar filtro de busca
+    query = aplicar_busca(query, search)
+    
+    # Ordenar por ID decrescente (mais recentes primeiro)
+    query = query.order_by(Linha.id.desc())
+    
+    # Paginação
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    html = render_template('_linhas_tabela.html', linhas=pagination.items)
+    return {
+        'html': Markup(html),
+        'quantidade': len(pagination.items),
+        'total': pagination.total,
+        'bytes': len(html.encode('utf-8')),
+    }
+
 @app.route('/linhas')
 @login_required
+@leitura_na_replica
 def listar_linhas():
     search = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)  # Padrão: 10 linhas por página
     
     try:
-        query = Linha.query
-        
-        # Aplicar filtro de busca
-        if search:
-            search_filter = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Linha.conta.like(search_filter),
-                    Linha.linha.like(search_filter),
-                    Linha.plano.like(search_filter),
-                    Linha.responsavel.like(search_filter),
-                    Linha.departamento.like(search_filter),
-                    Linha.status.like(search_filter),
-                    Linha.fase.like(search_filter)
-                )
-            )
+        chave = chave_fragmento_linhas(page, per_page, search, versao_linhas())
+        fragmento = fragmentos_linhas.obter(chave)
+        metricas.registrar_fragmento('linhas', fragmento is not None)
+        if fragmento is None:
+            fragmento = renderizar_fragmento_linhas(page, per_page, search)
+            fragmentos_linhas.definir(chave, fragmento, fragmento['bytes'])
         
-        # Ordenar por ID decrescente (mais recentes primeiro)
-        query = query.order_by(Linha.id.desc())
-        
-        # Paginação
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        linhas = pagination.items
+        pagination = paginacao_fragmento(page, per_page, fragmento)
         
         return render_template('linhas.html', 
-                             linhas=linhas, 
+                             corpo_tabela=fragmento['html'],
+                             quantidade=fragmento['quantidade'],
                              search=search,
                              pagination=pagination,
                              per_page=per_page)
@@ -447,8 +1139,12 @@ def adicionar_linha():
                 fase=request.form.get('fase', '')
             )
             
+            aplicar_ids_lookup(nova_linha)
             db.session.add(nova_linha)
+            atualizar_custos_mensais(depois=contribuicao_custos(nova_linha))
+            incrementar_versao_linhas()
             db.session.commit()
+            linhas_alteradas()
             flash('Linha adicionada com sucesso!', 'success')
             return redirect(url_for('listar_linhas', nova=nova_linha.id))
             
@@ -456,15 +1152,25 @@ def adicionar_linha():
             db.session.rollback()
             flash(f'Erro: {str(e)}', 'error')
     
-    return render_template('adicionar_linha.html')
+    return render_template('adicionar_linha.html', lookups=obter_lookups())
+
+def linha_travada_ou_404(id):
+    """
+    Linha travada até o commit (SELECT ... FOR UPDATE), relida do banco.
+    Todo escritor que mantém custos_mensais lê o "antes" assim, como a
+    importação e as operações em lote, para não aplicar deltas sobre um
+    valor já alterado por outra transação.
+    """
+    return Linha.query.filter_by(id=id).with_for_update().populate_existing().first_or_404()
 
 @app.route('/linhas/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
 def editar_linha(id):
     try:
-        linha = Linha.query.get_or_404(id)
-        
         if request.method == 'POST':
+            linha = linha_travada_ou_404(id)
+            custos_antes = contribuicao_custos(linha)
+            
             # Limpar e formatar o telefone antes de salvar
             telefone_raw = request.form['linha']
             telefone_limpo = limpar_telefone(telefone_raw)
@@ -485,11 +1191,16 @@ def editar_linha(id):
             linha.uso = request.form['uso']
             linha.fase = request.form.get('fase', '')
             
+            aplicar_ids_lookup(linha)
+            atualizar_custos_mensais(antes=custos_antes, depois=contribuicao_custos(linha))
+            incrementar_versao_linhas()
             db.session.commit()
+            linhas_alteradas()
             flash('Linha atualizada com sucesso!', 'success')
             return redirect(url_for('listar_linhas'))
         
-        return render_template('editar_linha.html', linha=linha)
+        linha = Linha.query.get_or_404(id)
+        return render_template('editar_linha.html', linha=linha, lookups=obter_lookups())
         
     except Exception as e:
         db.session.rollback()
@@ -501,9 +1212,12 @@ def editar_linha(id):
 @admin_required
 def excluir_linha(id):
     try:
-        linha = Linha.query.get_or_404(id)
+        linha = linha_travada_ou_404(id)
+        atualizar_custos_mensais(antes=contribuicao_custos(linha))
+        incrementar_versao_linhas()
         db.session.delete(linha)
         db.session.commit()
+        linhas_alteradas()
         flash('Linha excluída com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -512,126 +1226,566 @@ def excluir_linha(id):
     return redirect(url_for('listar_linhas'))
 
 # ========== EXPORTAÇÃO (CSV E EXCEL) ==========
+# Linhas lidas do banco por vez durante as exportações (cursor no servidor)
+EXPORTACAO_LOTE = int(os.getenv('EXPORTACAO_LOTE', '1000'))
+
+def consultar_linhas_exportacao(search=''):
+    """
+    Executa a consulta de exportação retornando tuplas (sem objetos ORM),
+    lidas em lotes por um cursor no servidor.
+    """
+    stmt = select(*COLUNAS_LINHA).order_by(Linha.id)
+    filtro = filtro_busca(search, db.engine.dialect.name)
+    if filtro is not None:
+        stmt = stmt.where(filtro)
+    stmt = stmt.execution_options(stream_results=True, yield_per=EXPORTACAO_LOTE)
+    return db.session.execute(stmt)
+
+def formatar_linha_exportacao(row):
+    """Converte a tupla do banco nos valores exibidos no arquivo exportado"""
+    (id_, conta, linha, plano, mensalidade, responsavel, departamento,
+     chipeira, efetivacao, termino, status, uso, fase) = row
+    return [
+        id_,
+        conta,
+        formatar_telefone(linha),  # Formatar para exibição
+        plano,
+        formatar_moeda(mensalidade),  # Formatar moeda
+        responsavel,
+        departamento,
+        chipeira,
+        formatar_data(efetivacao, vazio=''),
+        formatar_data(termino, vazio=''),
+        status,
+        uso,
+        fase or ''
+    ]
+
+def gerar_csv(resultado, progresso=None):
+    """Gera o CSV em blocos de bytes, sem montar o arquivo inteiro em memória"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    # BOM + cabeçalho (equivalente ao antigo encode('utf-8-sig'))
+    buffer.write('\ufeff')
+    writer.writerow(['ID', 'Conta', 'Linha', 'Plano', 'Mensalidade (R$)', 
+                    'Responsável', 'Departamento', 'Chipeira', 'Efetivação', 
+                    'Término', 'Status', 'Em Uso', 'Fase'])
+    
+    for particao in resultado.partitions():
+        writer.writerows(formatar_linha_exportacao(row) for row in particao)
+        if progresso:
+            progresso(len(particao))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    resto = buffer.getvalue()
+    if resto:
+        yield resto.encode('utf-8')
+
+def contar_bytes_exportados(formato, blocos):
+    """Repassa os blocos do arquivo e registra o tamanho total ao final"""
+    total = 0
+    for bloco in blocos:
+        total += len(bloco)
+        yield bloco
+    metricas.registrar_exportacao(formato, total)
+
+# Arquivos exportados reaproveitados por (formato, busca, versão da tabela)
+exportacoes_cache = CacheArquivos(
+    pasta=os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'projeto-contas-exports-cache')),
+    maxsize=int(os.getenv('EXPORT_CACHE_SIZE', '8'))
+)
+
+def chave_exportacao(formato, search, versao):
+    """
+    Chave do arquivo no cache. Inclui o banco de origem: a pasta pode ser
+    compartilhada e bancos diferentes (ex.: testes) repetem os números de versão.
+    """
+    return (formato, search, versao[0], app.config['SQLALCHEMY_DATABASE_URI'])
+
+def abrir_exportacao_em_cache(chave):
+    """Arquivo já gerado para a chave, aberto para leitura (ou None)"""
+    caminho = exportacoes_cache.obter(chave)
+    if caminho is None:
+        return None
+    try:
+        return open(caminho, 'rb')
+    except FileNotFoundError:  # Removido por outro worker entre as chamadas
+        return None
+
+def gravar_em_cache(chave, blocos):
+    """Repassa os blocos e guarda o arquivo completo no cache de exportações"""
+    with exportacoes_cache.gravar(chave) as destino:
+        for bloco in blocos:
+            destino.write(bloco)
+            yield bloco
+
 @app.route('/exportar/linhas')
 @login_required
 def exportar_linhas():
     """Redireciona para exportação CSV (mantém compatibilidade)"""
-    return redirect(url_for('exportar_linhas_csv'))
+    return redirect(url_for('exportar_linhas_csv', **request.args))
 
 @app.route('/exportar/linhas/csv')
 @login_required
+@leitura_na_replica
 def exportar_linhas_csv():
     try:
-        linhas = Linha.query.order_by(Linha.id).all()
-        
-        # Criar CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Cabeçalho
-        writer.writerow(['ID', 'Conta', 'Linha', 'Plano', 'Mensalidade (R$)', 
-                        'Responsável', 'Departamento', 'Chipeira', 'Efetivação', 
-                        'Término', 'Status', 'Em Uso', 'Fase'])
-        
-        # Dados
-        for linha in linhas:
-            writer.writerow([
-                linha.id,
-                linha.conta,
-                formatar_telefone_para_exibicao(linha.linha),  # Formatar para exibição
-                linha.plano,
-                formatar_moeda_br(linha.mensalidade),  # Formatar moeda
-                linha.responsavel,
-                linha.departamento,
-                linha.chipeira,
-                linha.efetivacao.strftime('%d/%m/%Y') if linha.efetivacao else '',
-                linha.termino.strftime('%d/%m/%Y') if linha.termino else '',
-                linha.status,
-                linha.uso,
-                linha.fase or ''
-            ])
-        
-        output.seek(0)
+        search = request.args.get('search', '')
+        versao = versao_linhas()
+        etag = versao_requisicao(versao)
+        if nao_modificado(etag):
+            return resposta_nao_modificada(etag)
         
-        # Retornar arquivo
         hoje = date.today().strftime('%Y-%m-%d')
         filename = f'linhas_telefonicas_{hoje}.csv'
         
-        return send_file(
-            BytesIO(output.getvalue().encode('utf-8-sig')),
+        chave = chave_exportacao('csv', search, versao)
+        arquivo = abrir_exportacao_em_cache(chave)
+        if arquivo is not None:
+            resposta = send_file(arquivo, mimetype='text/csv', as_attachment=True,
+                                 download_name=filename, etag=False)
+            return aplicar_versao(resposta, etag)
+        
+        # Retornar arquivo (transmitido em blocos e guardado no cache ao final)
+        resultado = consultar_linhas_exportacao(search)
+        blocos = gravar_em_cache(chave, contar_bytes_exportados('csv', gerar_csv(resultado)))
+        resposta = Response(
+            stream_with_context(blocos),
             mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
+        return aplicar_versao(resposta, etag)
         
     except Exception as e:
         flash(f'Erro ao exportar CSV: {str(e)}', 'error')
         return redirect(url_for('listar_linhas'))
 
+# Cabeçalho e largura fixa de cada coluna da planilha
+COLUNAS_EXCEL = (
+    ('ID', 8),
+    ('Conta', 14),
+    ('Linha Telefônica', 18),
+    ('Plano', 28),
+    ('Mensalidade', 14),
+    ('Responsável', 32),
+    ('Departamento', 22),
+    ('Chipeira', 10),
+    ('Data de Efetivação', 20),
+    ('Data de Término', 18),
+    ('Status', 13),
+    ('Em Uso', 8),
+    ('Fase', 18),
+)
+
+def gerar_excel(resultado, destino, progresso=None):
+    """
+    Grava a planilha em modo write-only: as linhas vão direto do cursor para
+    o arquivo, sem DataFrame e sem manter as células em memória.
+    """
+    # Import tardio: o openpyxl só é carregado por quem exporta/importa Excel
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Linhas Telefônicas')
+    
+    # Larguras precisam ser definidas antes da primeira linha no modo write-only
+    for indice, (_, largura) in enumerate(COLUNAS_EXCEL, start=1):
+        ws.column_dimensions[get_column_letter(indice)].width = largura
+    
+    ws.append([titulo for titulo, _ in COLUNAS_EXCEL])
+    
+    for particao in resultado.partitions():
+        for row in particao:
+            valores = formatar_linha_exportacao(row)
+            valores[4] = f"R$ {valores[4]}"
+            ws.append(valores)
+        if progresso:
+            progresso(len(particao))
+    
+    wb.save(destino)
+
 @app.route('/exportar/linhas/excel')
 @login_required
+@leitura_na_replica
 def exportar_linhas_excel():
     try:
-        linhas = Linha.query.order_by(Linha.id).all()
-        
-        # Converter para lista de dicionários
-        dados = []
-        for linha in linhas:
-            dados.append({
-                'ID': linha.id,
-                'Conta': linha.conta,
-                'Linha Telefônica': formatar_telefone_para_exibicao(linha.linha),
-                'Plano': linha.plano,
-                'Mensalidade': f"R$ {formatar_moeda_br(linha.mensalidade)}",
-                'Responsável': linha.responsavel,
-                'Departamento': linha.departamento,
-                'Chipeira': linha.chipeira,
-                'Data de Efetivação': linha.efetivacao.strftime('%d/%m/%Y') if linha.efetivacao else '',
-                'Data de Término': linha.termino.strftime('%d/%m/%Y') if linha.termino else '',
-                'Status': linha.status,
-                'Em Uso': linha.uso,
-                'Fase': linha.fase or ''
-            })
-        
-        # Criar DataFrame
-        df = pd.DataFrame(dados)
+        search = request.args.get('search', '')
+        versao = versao_linhas()
+        etag = versao_requisicao(versao)
+        if nao_modificado(etag):
+            return resposta_nao_modificada(etag)
         
-        # Criar arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Linhas Telefônicas', index=False)
-            
-            # Ajustar largura das colunas
-            worksheet = writer.sheets['Linhas Telefônicas']
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
+        chave = chave_exportacao('xlsx', search, versao)
+        output = abrir_exportacao_em_cache(chave)
+        if output is None:
+            # Gravada direto no cache de exportações (em disco)
+            resultado = consultar_linhas_exportacao(search)
+            with exportacoes_cache.gravar(chave) as destino:
+                gerar_excel(resultado, destino)
+                metricas.registrar_exportacao('xlsx', destino.tell())
+            output = abrir_exportacao_em_cache(chave)
         
         # Retornar arquivo
         hoje = date.today().strftime('%Y-%m-%d')
         filename = f'linhas_telefonicas_{hoje}.xlsx'
         
-        return send_file(
+        resposta = send_file(
             output,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            etag=False
         )
+        return aplicar_versao(resposta, etag)
         
     except Exception as e:
         flash(f'Erro ao exportar Excel: {str(e)}', 'error')
         return redirect(url_for('listar_linhas'))
 
+# ========== EXPORTAÇÃO EM SEGUNDO PLANO ==========
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+jobs_exportacao = GerenciadorJobs(
+    pasta=os.getenv('EXPORT_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'projeto-contas-exports')),
+    workers=int(os.getenv('EXPORT_WORKERS', '2')),
+    ttl=int(os.getenv('EXPORT_TTL', '3600'))
+)
+
+def construir_exportacao(caminho, job):
+    """Executado no pool de exportação: grava o arquivo do job no spool"""
+    with app.app_context():
+        search = job.filtros.get('search', '')
+        filtro = filtro_busca(search, db.engine.dialect.name)
+        if filtro is None:
+            job.total_linhas = obter_estatisticas()['resumo']['total_linhas']
+        else:
+            job.total_linhas = db.session.query(func.count(Linha.id)).filter(filtro).scalar()
+        
+        resultado = consultar_linhas_exportacao(search)
+        with open(caminho, 'wb') as destino:
+            if job.formato == 'csv':
+                for bloco in gerar_csv(resultado, job.registrar_progresso):
+                    destino.write(bloco)
+            else:
+                gerar_excel(resultado, destino, job.registrar_progresso)
+            metricas.registrar_exportacao(job.formato, destino.tell())
+
+@app.route('/exportar/jobs', methods=['POST'])
+@login_required
+def criar_job_exportacao():
+    """Enfileira uma exportação; pedidos idênticos em andamento são reaproveitados"""
+    dados = request.get_json(silent=True) or request.form
+    formato = (dados.get('formato') or 'csv').lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'success': False, 'error': 'Formato inválido (use csv ou xlsx)'}), 400
+    
+    filtros = {'search': (dados.get('search') or '').strip()}
+    chave = (formato, filtros['search'])
+    
+    job, criado = jobs_exportacao.submeter(chave, formato, filtros, construir_exportacao)
+    return jsonify({
+        'success': True,
+        'reaproveitado': not criado,
+        'job': job.to_dict(),
+        'url': url_for('status_job_exportacao', job_id=job.id)
+    }), 202
+
+@app.route('/exportar/jobs/<job_id>')
+@login_required
+def status_job_exportacao(job_id):
+    """Retorna o progresso do job ou, com ?download=1, o arquivo pronto"""
+    job = jobs_exportacao.obter(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    
+    if request.args.get('download') == '1':
+        if job.status != 'concluido':
+            return jsonify({'success': False, 'error': 'Exportação ainda não concluída',
+                            'job': job.to_dict()}), 409
+        
+        data = datetime.fromtimestamp(job.criado_em).strftime('%Y-%m-%d')
+        return send_file(
+            job.arquivo,
+            mimetype=FORMATOS_EXPORTACAO[job.formato],
+            as_attachment=True,
+            download_name=f'linhas_telefonicas_{data}.{job.formato}'
+        )
+    
+    resposta = {'success': True, 'job': job.to_dict()}
+    if job.status == 'concluido':
+        resposta['download_url'] = url_for('status_job_exportacao', job_id=job.id, download=1)
+    return jsonify(resposta)
+
+# ========== IMPORTAÇÃO EM LOTE ==========
+# Linhas gravadas por comando (executemany) durante a importação
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', '1000'))
+# Quantidade máxima de erros detalhados devolvidos na resposta
+IMPORTACAO_MAX_ERROS = 1000
+
+# Cabeçalhos aceitos: os gerados pelas exportações CSV e Excel
+CABECALHOS_IMPORTACAO = {
+    'ID': 'id',
+    'Conta': 'conta',
+    'Linha': 'linha',
+    'Linha Telefônica': 'linha',
+    'Plano': 'plano',
+    'Mensalidade': 'mensalidade',
+    'Mensalidade (R$)': 'mensalidade',
+    'Responsável': 'responsavel',
+    'Departamento': 'departamento',
+    'Chipeira': 'chipeira',
+    'Efetivação': 'efetivacao',
+    'Data de Efetivação': 'efetivacao',
+    'Término': 'termino',
+    'Data de Término': 'termino',
+    'Status': 'status',
+    'Em Uso': 'uso',
+    'Fase': 'fase',
+}
+CAMPOS_OBRIGATORIOS = ('conta', 'linha', 'plano', 'mensalidade', 'responsavel', 'departamento',
+                       'chipeira', 'efetivacao', 'termino', 'status', 'uso')
+CAMPOS_IMPORTACAO = CAMPOS_OBRIGATORIOS + ('fase',)
+
+def converter_moeda_br(valor):
+    """Converte 'R$ 1.234,56' / '48,08' / 48.08 em Decimal"""
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    texto = str(valor).replace('R$', '').replace(' ', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'mensalidade inválida: {valor}')
+
+def converter_data_br(valor, campo):
+    """Converte 'dd/mm/aaaa' (ou aaaa-mm-dd / data do Excel) em date"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for fmt in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'{campo} inválida: {valor}')
+
+def normalizar_registro_importacao(bruto):
+    """Valida e normaliza um registro lido do arquivo (ValueError com a lista de erros)"""
+    erros = []
+    registro = {}
+    
+    for campo in CAMPOS_OBRIGATORIOS:
+        valor = bruto.get(campo)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            erros.append(f'{campo} obrigatório')
+    if erros:
+        raise ValueError(erros)
+    
+    id_bruto = bruto.get('id')
+    if id_bruto not in (None, ''):
+        try:
+            registro['id'] = int(id_bruto)
+        except (TypeError, ValueError):
+            erros.append(f'id inválido: {id_bruto}')
+    
+    for campo in ('conta', 'plano', 'responsavel', 'departamento'):
+        registro[campo] = str(bruto[campo]).strip()
+    
+    registro['linha'] = limpar_telefone(bruto['linha'])
+    if not 8 <= len(registro['linha']) <= 20:
+        erros.append(f'linha inválida: {bruto["linha"]}')
+    
+    try:
+        registro['mensalidade'] = converter_moeda_br(bruto['mensalidade'])
+    except ValueError as e:
+        erros.append(str(e))
+    
+    for campo in ('efetivacao', 'termino'):
+        try:
+            registro[campo] = converter_data_br(bruto[campo], campo)
+        except ValueError as e:
+            erros.append(str(e))
+    
+    for campo in ('chipeira', 'uso'):
+        valor = str(bruto[campo]).strip()
+        if valor not in ('Sim', 'Não'):
+            erros.append(f'{campo} deve ser Sim ou Não: {valor}')
+        registro[campo] = valor
+    
+    registro['status'] = str(bruto['status']).strip()
+    if registro['status'] not in STATUS_LINHA:
+        erros.append(f'status inválido: {registro["status"]}')
+    
+    fase = bruto.get('fase')
+    registro['fase'] = str(fase).strip() if fase not in (None, '') else ''
+    
+    if erros:
+        raise ValueError(erros)
+    return registro
+
+def ler_arquivo_importacao(arquivo):
+    """
+    Lê o arquivo enviado linha a linha (CSV ou XLSX) e gera
+    (numero_da_linha, dicionario_com_campos).
+    """
+    nome = (arquivo.filename or '').lower()
+    
+    if nome.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        wb = load_workbook(arquivo.stream, read_only=True, data_only=True)
+        try:
+            linhas = wb.worksheets[0].iter_rows(values_only=True)
+            yield from _mapear_linhas_importacao(linhas)
+        finally:
+            wb.close()
+    elif nome.endswith('.csv'):
+        # Decodifica por linha com iterdecode: o upload chega como
+        # SpooledTemporaryFile, que antes do Python 3.11 não tem readable()
+        # e não pode ser envolvido num TextIOWrapper
+        texto = codecs.iterdecode(arquivo.stream, 'utf-8-sig')
+        yield from _mapear_linhas_importacao(csv.reader(texto))
+    else:
+        raise ValueError('Formato não suportado (envie .csv ou .xlsx)')
+
+def _mapear_linhas_importacao(linhas):
+    cabecalho = next(linhas, None)
+    if not cabecalho:
+        raise ValueError('Arquivo vazio')
+    
+    indices = {}
+    for i, titulo in enumerate(cabecalho):
+        campo = CABECALHOS_IMPORTACAO.get(str(titulo or '').strip())
+        if campo:
+            indices[campo] = i
+    
+    faltando = [c for c in CAMPOS_OBRIGATORIOS if c not in indices]
+    if faltando:
+        raise ValueError(f'Colunas ausentes no cabeçalho: {", ".join(faltando)}')
+    
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(v not in (None, '') for v in valores):
+            continue  # linha em branco
+        yield numero, {campo: valores[i] if i < len(valores) else None
+                       for campo, i in indices.items()}
+
+def gravar_lote_importacao(novos, existentes):
+    """
+    Grava um lote: registros sem id com INSERT em lote; registros com id
+    com upsert (ON DUPLICATE KEY UPDATE no MySQL, ON CONFLICT no SQLite).
+    O rollup de custos recebe os deltas na mesma transação.
+    """
+    tabela = Linha.__table__
+    deltas = {}
+    
+    # O mesmo id repetido no lote: vale a última ocorrência, como no upsert.
+    # Sem isso o rollup somaria as duas versões e subtrairia a anterior uma vez só
+    existentes = list({registro['id']: registro for registro in existentes}.values())
+    
+    # Valores atuais das linhas que serão sobrescritas (travadas até o commit)
+    anteriores = {}
+    ids = [registro['id'] for registro in existentes]
+    colunas_custos = [getattr(Linha, c) for c in CAMPOS_CUSTOS]
+    for inicio in range(0, len(ids), LOTE_IDS_POR_COMANDO):
+        rows = db.session.execute(
+            select(Linha.id, *colunas_custos)
+            .where(Linha.id.in_(ids[inicio:inicio + LOTE_IDS_POR_COMANDO]))
+            .with_for_update()
+        ).all()
+        anteriores.update((row[0], dict(zip(CAMPOS_CUSTOS, row[1:]))) for row in rows)
+    
+    for registro in existentes:
+        if registro['id'] in anteriores:
+            acumular_custos(deltas, contribuicao_custos_valores(anteriores[registro['id']]), -1)
+    for registro in novos + existentes:
+        acumular_custos(deltas, contribuicao_custos_valores(registro), 1)
+    
+    preencher_ids_lookup(novos + existentes)
+    if novos:
+        db.session.execute(tabela.insert(), novos)
+    
+    if existentes:
+        colunas = CAMPOS_IMPORTACAO + tuple(coluna for _, coluna in LOOKUPS_LINHA.values())
+        stmt = comando_upsert(tabela, lambda novo: {c: novo[c] for c in colunas})
+        db.session.execute(stmt, existentes)
+    
+    aplicar_deltas_custos(deltas)
+    incrementar_versao_linhas()
+    db.session.commit()
+
+@app.route('/linhas/importar', methods=['POST'])
+@login_required
+def importar_linhas():
+    """
+    Importa linhas a partir de um CSV/XLSX no layout das exportações.
+    Linhas com ID atualizam o registro existente; sem ID são inseridas.
+    """
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+    
+    lote = request.form.get('lote', IMPORTACAO_LOTE, type=int)
+    lote = max(lote, 1)
+    
+    importadas = 0
+    total_erros = 0
+    erros = []
+    novos, existentes = [], []
+    
+    def registrar_erro(numero, mensagens):
+        nonlocal total_erros
+        total_erros += 1
+        if len(erros) < IMPORTACAO_MAX_ERROS:
+            erros.append({'linha': numero, 'erros': mensagens})
+    
+    def gravar():
+        nonlocal importadas, novos, existentes
+        quantidade = len(novos) + len(existentes)
+        try:
+            gravar_lote_importacao(novos, existentes)
+            importadas += quantidade
+        except Exception as e:
+            db.session.rollback()
+            registrar_erro(None, [f'Falha ao gravar lote de {quantidade} linhas: {str(e)}'])
+        novos, existentes = [], []
+    
+    try:
+        for numero, bruto in ler_arquivo_importacao(arquivo):
+            try:
+                registro = normalizar_registro_importacao(bruto)
+            except ValueError as e:
+                registrar_erro(numero, e.args[0] if isinstance(e.args[0], list) else [str(e)])
+                continue
+            
+            (existentes if 'id' in registro else novos).append(registro)
+            if len(novos) + len(existentes) >= lote:
+                gravar()
+        
+        if novos or existentes:
+            gravar()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e), 'importadas': importadas}), 400
+    finally:
+        if importadas:
+            linhas_alteradas()
+    
+    return jsonify({
+        'success': total_erros == 0,
+        'importadas': importadas,
+        'total_erros': total_erros,
+        'erros': erros
+    })
+
 # ========== GERENCIAR USUÁRIOS ==========
 @app.route('/usuarios')
 @login_required
@@ -691,6 +1845,7 @@ def atualizar_usuario(id):
             usuario.set_password(data['senha'])
         
         db.session.commit()
+        invalidar_usuario(id)
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -707,6 +1862,7 @@ def excluir_usuario(id):
         usuario = Usuario.query.get_or_404(id)
         db.session.delete(usuario)
         db.session.commit()
+        invalidar_usuario(id)
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -715,81 +1871,482 @@ def excluir_usuario(id):
 # ========== API PARA DASHBOARD ==========
 @app.route('/api/dashboard/stats')
 @login_required
+@leitura_na_replica
 def api_dashboard_stats():
     try:
-        total_linhas = Linha.query.count()
-        ativas = Linha.query.filter_by(status='Ativa').count()
-        a_cancelar = Linha.query.filter_by(status='A Cancelar').count()
-        canceladas = Linha.query.filter_by(status='Cancelada').count()
+        versao = versao_linhas()
+        etag = versao_requisicao(versao)
+        if nao_modificado(etag):
+            return resposta_nao_modificada(etag)
         
-        from sqlalchemy import func
-        resultado = db.session.query(
-            func.sum(Linha.mensalidade).label('custo_total'),
-            func.avg(Linha.mensalidade).label('media_mensalidade')
-        ).first()
+        resumo = obter_estatisticas(versao[0])['resumo']
         
-        return jsonify({
+        return aplicar_versao(jsonify({
             'success': True,
             'data': {
-                'total_linhas': total_linhas,
-                'linhas_ativas': ativas,
-                'linhas_a_cancelar': a_cancelar,
-                'linhas_canceladas': canceladas,
-                'custo_mensal_total': float(resultado.custo_total or 0),
-                'media_mensalidade': float(resultado.media_mensalidade or 0)
+                'total_linhas': resumo['total_linhas'],
+                'linhas_ativas': resumo['linhas_ativas'],
+                'linhas_a_cancelar': resumo['linhas_a_cancelar'],
+                'linhas_canceladas': resumo['linhas_canceladas'],
+                'custo_mensal_total': resumo['custo_mensal_total'],
+                'media_mensalidade': resumo['media_mensalidade']
             }
-        })
+        }), etag)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 # ========== API PARA PAGINAÇÃO ==========
 @app.route('/api/linhas')
 @login_required
+@leitura_na_replica
 def api_listar_linhas():
     """API para paginação AJAX (opcional)"""
     try:
+        versao = versao_linhas()
+        etag = versao_requisicao(versao)
+        if nao_modificado(etag):
+            return resposta_nao_modificada(etag)
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
         
-        query = Linha.query
-        
-        if search:
-            search_filter = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Linha.conta.like(search_filter),
-                    Linha.linha.like(search_filter),
-                    Linha.plano.like(search_filter),
-                    Linha.responsavel.like(search_filter),
-                    Linha.departamento.like(search_filter),
-                    Linha.status.like(search_filter)
-                )
-            )
+        # Projeção de colunas: sem hidratar objetos ORM
+        filtro = filtro_busca(search, db.engine.dialect.name)
+        stmt = select(*COLUNAS_LINHA)
+        if filtro is not None:
+            stmt = stmt.where(filtro)
         
-        query = query.order_by(Linha.id.desc())
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Modo cursor (?after=): custo constante em qualquer profundidade
+        if 'after' in request.args:
+            resposta = make_response(api_listar_linhas_cursor(stmt, filtro, request.args['after'], per_page, versao[0]))
+            return aplicar_versao(resposta, etag) if resposta.status_code == 200 else resposta
         
-        linhas_data = [linha.to_dict() for linha in pagination.items]
+        # Mesmas regras do paginate() do Flask-SQLAlchemy
+        page = page if page >= 1 else 1
+        per_page = per_page if per_page >= 1 else 20
         
-        return jsonify({
+        total_stmt = select(func.count(Linha.id))
+        if filtro is not None:
+            total_stmt = total_stmt.where(filtro)
+        total = db.session.execute(total_stmt).scalar()
+        
+        rows = db.session.execute(
+            stmt.order_by(Linha.id.desc()).limit(per_page).offset((page - 1) * per_page)
+        ).all()
+        
+        pages = ceil(total / per_page) if total else 0
+        has_prev = page > 1
+        has_next = page < pages
+        
+        return aplicar_versao(jsonify({
             'success': True,
-            'data': linhas_data,
+            'data': [serializar_linha(row) for row in rows],
             'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next,
-                'prev_num': pagination.prev_num,
-                'next_num': pagination.next_num
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': pages,
+                'has_prev': has_prev,
+                'has_next': has_next,
+                'prev_num': page - 1 if has_prev else None,
+                'next_num': page + 1 if has_next else None
             }
+        }), etag)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def api_listar_linhas_cursor(stmt, filtro, after, per_page, versao=None):
+    """
+    Paginação keyset sobre Linha.id DESC. O total só é calculado com
+    ?with_total=1 (sem busca, vem do snapshot de estatísticas em cache).
+    """
+    try:
+        ultimo_id = decodificar_cursor(after) if after else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    per_page = max(per_page, 1)
+    
+    if ultimo_id is not None:
+        stmt = stmt.where(Linha.id < ultimo_id)
+    
+    # Busca um registro a mais só para saber se existe próxima página
+    rows = db.session.execute(stmt.order_by(Linha.id.desc()).limit(per_page + 1)).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    paginacao = {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': codificar_cursor(rows[-1].id) if has_next else None
+    }
+    
+    if request.args.get('with_total') == '1':
+        if filtro is not None:
+            paginacao['total'] = db.session.execute(
+                select(func.count(Linha.id)).where(filtro)
+            ).scalar()
+        else:
+            paginacao['total'] = obter_estatisticas(versao)['resumo']['total_linhas']
+    
+    return jsonify({
+        'success': True,
+        'data': [serializar_linha(row) for row in rows],
+        'pagination': paginacao
+    })
+
+# ========== API DE ALTERAÇÃO EM LOTE ==========
+# Operações por requisição e ids por operação
+LOTE_MAX_OPERACOES = int(os.getenv('BATCH_MAX_OPERACOES', '100'))
+LOTE_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', '5000'))
+# Tamanho de cada IN (...) nos comandos
+LOTE_IDS_POR_COMANDO = 1000
+
+ACOES_LOTE = ('atualizar', 'excluir')
+CAMPOS_LOTE = ('conta', 'plano', 'mensalidade', 'responsavel', 'departamento',
+               'chipeira', 'efetivacao', 'termino', 'status', 'uso', 'fase')
+FILTROS_LOTE = ('departamento', 'conta', 'status', 'search')
+
+def normalizar_valores_lote(valores):
+    """Valida os campos a alterar (mesmas regras da importação)"""
+    if not isinstance(valores, dict) or not valores:
+        return {}, ['valores obrigatório']
+    
+    erros = []
+    registro = {}
+    for campo, valor in valores.items():
+        if campo not in CAMPOS_LOTE:
+            erros.append(f'campo não pode ser alterado em lote: {campo}')
+            continue
+        try:
+            if campo == 'mensalidade':
+                registro[campo] = converter_moeda_br(valor)
+            elif campo in ('efetivacao', 'termino'):
+                registro[campo] = converter_data_br(valor, campo)
+            elif campo in ('chipeira', 'uso'):
+                registro[campo] = str(valor).strip()
+                if registro[campo] not in ('Sim', 'Não'):
+                    raise ValueError(f'{campo} deve ser Sim ou Não: {valor}')
+            elif campo == 'status':
+                registro[campo] = str(valor).strip()
+                if registro[campo] not in STATUS_LINHA:
+                    raise ValueError(f'status inválido: {valor}')
+            elif campo == 'fase':
+                registro[campo] = str(valor).strip() if valor not in (None, '') else ''
+            else:
+                registro[campo] = str(valor if valor is not None else '').strip()
+                if not registro[campo]:
+                    raise ValueError(f'{campo} obrigatório')
+        except ValueError as e:
+            erros.append(str(e))
+    return registro, erros
+
+def validar_operacao_lote(operacao):
+    """
+    Normaliza uma operação do lote. Retorna (operacao, erros); a operação
+    normalizada tem 'acao', 'condicao', 'ids' (ou None) e 'valores'.
+    """
+    if not isinstance(operacao, dict):
+        return None, ['operação deve ser um objeto']
+    
+    erros = []
+    acao = operacao.get('acao')
+    if acao not in ACOES_LOTE:
+        erros.append('acao deve ser atualizar ou excluir')
+    
+    ids = operacao.get('ids')
+    filtro = operacao.get('filtro')
+    condicao = None
+    if (ids is None) == (filtro is None):
+        erros.append('informe ids ou filtro (apenas um)')
+    elif ids is not None:
+        # Só lista de inteiros JSON: "12" viraria [1, 2], 1.9 viraria 1 e true viraria 1
+        if not isinstance(ids, list) or any(isinstance(i, bool) or not isinstance(i, int) for i in ids):
+            erros.append('ids deve ser uma lista de inteiros')
+        else:
+            ids = sorted(set(ids))
+            if not ids:
+                erros.append('ids vazio')
+            elif len(ids) > LOTE_MAX_IDS:
+                erros.append(f'máximo de {LOTE_MAX_IDS} ids por operação')
+            else:
+                condicao = Linha.id.in_(ids)
+    else:
+        if not isinstance(filtro, dict) or not any(filtro.get(c) for c in FILTROS_LOTE):
+            # Sem filtro a operação atingiria a tabela inteira
+            erros.append(f'filtro deve ter ao menos um de: {", ".join(FILTROS_LOTE)}')
+        elif set(filtro) - set(FILTROS_LOTE):
+            erros.append(f'filtro inválido: {", ".join(sorted(set(filtro) - set(FILTROS_LOTE)))}')
+        else:
+            condicoes = [getattr(Linha, c) == filtro[c] for c in ('departamento', 'conta', 'status') if filtro.get(c)]
+            if filtro.get('search'):
+                condicoes.append(filtro_busca(str(filtro['search']), db.engine.dialect.name))
+            condicao = and_(*condicoes)
+    
+    valores = {}
+    if acao == 'atualizar':
+        valores, erros_valores = normalizar_valores_lote(operacao.get('valores'))
+        erros.extend(erros_valores)
+    
+    if erros:
+        return None, erros
+    return {'acao': acao, 'condicao': condicao, 'ids': ids, 'valores': valores}, []
+
+def executar_operacao_lote(operacao, deltas):
+    """
+    Executa uma operação já validada na transação corrente com comandos
+    por conjunto (UPDATE/DELETE ... WHERE id IN (...)). Acumula em `deltas`
+    o efeito no rollup de custos. Retorna os ids afetados.
+    """
+    colunas_custos = [getattr(Linha, c) for c in CAMPOS_CUSTOS]
+    rows = db.session.execute(
+        select(Linha.id, *colunas_custos).where(operacao['condicao']).with_for_update()
+    ).all()
+    ids = [row[0] for row in rows]
+    
+    valores = operacao['valores']
+    altera_custos = operacao['acao'] == 'excluir' or any(c in valores for c in CAMPOS_CUSTOS)
+    if altera_custos:
+        for row in rows:
+            antes = dict(zip(CAMPOS_CUSTOS, row[1:]))
+            acumular_custos(deltas, contribuicao_custos_valores(antes), -1)
+            if operacao['acao'] == 'atualizar':
+                acumular_custos(deltas, contribuicao_custos_valores({**antes, **valores}), 1)
+    
+    if ids and operacao['acao'] == 'atualizar':
+        preencher_ids_lookup([valores])
+    
+    tabela = Linha.__table__
+    for inicio in range(0, len(ids), LOTE_IDS_POR_COMANDO):
+        condicao = tabela.c.id.in_(ids[inicio:inicio + LOTE_IDS_POR_COMANDO])
+        if operacao['acao'] == 'atualizar':
+            db.session.execute(tabela.update().where(condicao).values(**valores))
+        else:
+            db.session.execute(tabela.delete().where(condicao))
+    return ids
+
+@app.route('/api/linhas/batch', methods=['POST'])
+@login_required
+def api_linhas_batch():
+    """
+    Atualiza/exclui várias linhas em uma transação. Corpo:
+    {"operacoes": [{"acao": "atualizar", "ids": [1, 2], "valores": {"status": "A Cancelar"}},
+                   {"acao": "excluir", "filtro": {"departamento": "RH", "status": "Cancelada"}}]}
+    Exclusões exigem administrador. Se alguma operação for inválida nada é
+    gravado; a resposta traz o resultado de cada operação.
+    """
+    dados = request.get_json(silent=True) or {}
+    operacoes = dados.get('operacoes')
+    if not isinstance(operacoes, list) or not operacoes:
+        return jsonify({'success': False, 'error': 'operacoes deve ser uma lista não vazia'}), 400
+    if len(operacoes) > LOTE_MAX_OPERACOES:
+        return jsonify({'success': False, 'error': f'Máximo de {LOTE_MAX_OPERACOES} operações por lote'}), 400
+    
+    validas = []
+    resultados = []
+    acesso_negado = False
+    for indice, bruta in enumerate(operacoes):
+        operacao, erros = validar_operacao_lote(bruta)
+        if operacao and operacao['acao'] == 'excluir' and not current_user.isAdmin:
+            operacao, erros = None, ['Acesso negado. Apenas administradores podem excluir.']
+            acesso_negado = True
+        if erros:
+            resultados.append({'indice': indice, 'success': False, 'erros': erros})
+        else:
+            resultados.append({'indice': indice, 'success': True})
+        validas.append(operacao)
+    
+    if not all(r['success'] for r in resultados):
+        return jsonify({'success': False, 'error': 'Lote rejeitado; nenhuma alteração foi gravada',
+                        'resultados': resultados}), 403 if acesso_negado else 400
+    
+    try:
+        deltas = {}
+        for resultado, operacao in zip(resultados, validas):
+            ids = executar_operacao_lote(operacao, deltas)
+            resultado['acao'] = operacao['acao']
+            resultado['afetadas'] = len(ids)
+            if operacao['ids'] is not None:
+                resultado['nao_encontrados'] = sorted(set(operacao['ids']) - set(ids))
+        
+        total = sum(r['afetadas'] for r in resultados)
+        if total:
+            aplicar_deltas_custos(deltas)
+            incrementar_versao_linhas()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if total:
+        linhas_alteradas()
+    return jsonify({'success': True, 'total_afetadas': total, 'resultados': resultados})
+
+# ========== API DE VENCIMENTOS ==========
+@app.route('/api/linhas/vencendo')
+@login_required
+def api_linhas_vencendo():
+    """
+    Linhas ativas vencidas ou com término em até 30/60/90 dias.
+    ?faixa=vencidas|30|60|90 retorna só uma faixa; ?resumo=1 omite as linhas.
+    """
+    try:
+        vencimentos = obter_vencimentos()
+        faixas = vencimentos['faixas']
+        
+        faixa = request.args.get('faixa')
+        if faixa:
+            faixas = [f for f in faixas if f['faixa'] == faixa]
+            if not faixas:
+                return jsonify({'success': False, 'error': 'faixa inválida'}), 400
+        
+        if request.args.get('resumo') == '1':
+            faixas = [{k: v for k, v in f.items() if k != 'linhas'} for f in faixas]
+        
+        return jsonify({
+            'success': True,
+            'referencia': vencimentos['referencia'],
+            'gerado_em': vencimentos['gerado_em'],
+            'faixas': faixas
         })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+# ========== API DE CUSTOS ==========
+AGRUPAMENTOS_CUSTOS = {
+    'departamento': CustoMensal.departamento,
+    'conta': CustoMensal.conta,
+    'status': CustoMensal.status,
+}
+
+@app.route('/api/custos/serie')
+@login_required
+@leitura_na_replica
+def api_custos_serie():
+    """
+    Série mensal de custo e quantidade de linhas, lida do rollup.
+    ?meses=12|24|60 (até o mês atual), ?agrupar=departamento|conta|status,
+    filtros opcionais ?departamento=, ?conta=, ?status=.
+    """
+    try:
+        meses = request.args.get('meses', 12, type=int)
+        if not 1 <= meses <= 120:
+            return jsonify({'success': False, 'error': 'meses deve estar entre 1 e 120'}), 400
+        
+        agrupar = request.args.get('agrupar', '')
+        if agrupar and agrupar not in AGRUPAMENTOS_CUSTOS:
+            return jsonify({'success': False, 'error': 'agrupar inválido'}), 400
         
+        fim = primeiro_dia_mes(date.today())
+        inicio = somar_meses(fim, -(meses - 1))
+        lista_meses = list(meses_entre(inicio, fim))
+        
+        coluna_grupo = AGRUPAMENTOS_CUSTOS.get(agrupar)
+        colunas = [CustoMensal.mes]
+        if coluna_grupo is not None:
+            colunas.append(coluna_grupo)
+        
+        stmt = select(
+            *colunas,
+            func.sum(CustoMensal.quantidade),
+            func.sum(CustoMensal.custo_total)
+        ).where(CustoMensal.mes.between(inicio, fim)).group_by(*colunas)
+        
+        for campo in ('departamento', 'conta', 'status'):
+            valor = request.args.get(campo)
+            if valor:
+                stmt = stmt.where(getattr(CustoMensal, campo) == valor)
+        
+        indice_mes = {mes: i for i, mes in enumerate(lista_meses)}
+        series = {}
+        for row in db.session.execute(stmt):
+            grupo = row[1] if coluna_grupo is not None else 'Total'
+            serie = series.setdefault(grupo, {
+                'grupo': grupo,
+                'quantidade': [0] * meses,
+                'custo_total': [0.0] * meses
+            })
+            i = indice_mes[row[0]]
+            serie['quantidade'][i] = int(row[-2] or 0)
+            serie['custo_total'][i] = float(row[-1] or 0)
+        
+        return jsonify({
+            'success': True,
+            'meses': [mes.strftime('%Y-%m') for mes in lista_meses],
+            'series': sorted(series.values(), key=lambda s: -sum(s['custo_total']))
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+# ========== MÉTRICAS INTERNAS ==========
+@app.route('/internal/metrics/pool')
+@acesso_interno
+def metricas_pool():
+    """Estado do pool de conexões deste worker (em uso, overflow, espera)"""
+    dados = {
+        'success': True,
+        'pid': os.getpid(),
+        'pool': estatisticas_pool(db.engine)
+    }
+    if replica.BIND_REPLICA in db.engines:
+        dados['pool_replica'] = estatisticas_pool(db.engines[replica.BIND_REPLICA])
+    return jsonify(dados)
+
+@app.route('/metrics')
+@acesso_interno
+def metrics():
+    """Métricas no formato Prometheus"""
+    corpo, content_type = metricas.gerar_metricas()
+    return Response(corpo, content_type=content_type)
+
+# ========== SAÚDE (PROBES DO KUBERNETES) ==========
+# Sem login: chamados pelo kubelet. Ver saude.py.
+def verificar_replica():
+    """Periódica (por worker): tira a réplica de uso enquanto ela não responder"""
+    with app.app_context():
+        erro = saude.verificar_conexao(db.engines[replica.BIND_REPLICA], banco='replica')
+    if replica.marcar_disponibilidade(erro is None):
+        if erro:
+            app.logger.warning('Réplica indisponível, leituras no primário: %s', erro)
+        else:
+            app.logger.warning('Réplica disponível novamente')
+    metricas.registrar_replica(erro is None)
+
+agendador_replica = TarefaPeriodica('saude-replica', 5, verificar_replica)
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: o processo está respondendo (não consulta o banco)"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """
+    Readiness: SELECT 1 pelo pool do primário, resultado em cache curto. A
+    réplica só é informada: fora do ar, as leituras usam o primário.
+    """
+    resultado = saude.prontidao(db.engine)
+    corpo = {'status': 'ok' if resultado['pronto'] else 'indisponivel'}
+    if replica.configurada():
+        corpo['replica'] = 'ok' if replica.disponivel() else 'indisponivel'
+    if not resultado['pronto']:
+        corpo['error'] = resultado['erro']
+        return jsonify(corpo), 503
+    return jsonify(corpo)
+
+@app.route('/startupz')
+def startupz():
+    """Startup: tabelas e colunas dos modelos já criadas pelo init-db"""
+    try:
+        pendentes = saude.pendencias_esquema(db.engine, db.metadata)
+    except Exception as e:
+        return jsonify({'status': 'indisponivel', 'error': str(e) or 'sem resposta do banco'}), 503
+    if pendentes:
+        return jsonify({'status': 'aguardando migracoes', 'pendentes': pendentes}), 503
+    return jsonify({'status': 'ok'})
+
 # ========== ROTA PARA TESTE ==========
 @app.route('/teste')
 def teste():
@@ -801,8 +2358,23 @@ def teste():
         'usuarios': Usuario.query.count()
     })
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Cria tabelas, índices e o usuário admin (executar uma vez por deploy)"""
+    if not init_db():
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-custos')
+def rebuild_custos_command():
+    """Recalcula o rollup de custos mensais a partir das linhas"""
+    grupos = reconstruir_custos_mensais()
+    print(f"✅ Custos mensais recalculados: {grupos} grupos")
+
 # ========== INICIALIZAÇÃO ==========
+# Servidor de desenvolvimento. Em produção use o gunicorn com wsgi.py
+# (ver gunicorn.conf.py) e rode `flask --app wsgi init-db` uma vez por deploy.
 if __name__ == '__main__':
+    create_app()
     with app.app_context():
         if init_db():
             print("=" * 60)
@@ -820,6 +2392,6 @@ if __name__ == '__main__':
             print("📄 PAGINAÇÃO: 10 linhas por página (configurável)")
             print("🔗 Rota de compatibilidade: /exportar/linhas")
             print("=" * 60)
-            app.run(debug=True, host='0.0.0.0', port=5000)
+            app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=5000)
         else:
-            print("❌ Não foi possível iniciar o sistema. Verifique os erros acima.")
\ No newline at end of file
+            print("❌ Não foi possível iniciar o sistema. Verifique os erros acima.")
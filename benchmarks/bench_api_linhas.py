@@ -0,0 +1,69 @@
+"""
+Benchmark de /api/linhas: ORM + to_dict + json padrão (original) x projeção + serializar_linha
+
+Mede latência (p50/p99) e tempo de CPU por página para per_page 100/500.
+
+Uso:
+    python benchmarks/bench_api_linhas.py [--linhas 20000] [--repeticoes 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from comum import popular_linhas, percentil
+
+from sqlalchemy import create_engine, select
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=20_000)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_api.db')
+    os.environ['DATABASE_URL'] = url
+    popular_linhas(create_engine(url), args.linhas)
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app, db, Linha, COLUNAS_LINHA, serializar_linha
+    app = create_app()
+
+    json_padrao = DefaultJSONProvider(app)
+    json_app = app.json
+
+    def original(page, per_page):
+        pagination = Linha.query.order_by(Linha.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False)
+        return json_padrao.dumps({'data': [linha.to_dict() for linha in pagination.items],
+                                  'total': pagination.total})
+
+    def novo(page, per_page):
+        total = Linha.query.count()
+        rows = db.session.execute(
+            select(*COLUNAS_LINHA).order_by(Linha.id.desc())
+            .limit(per_page).offset((page - 1) * per_page)
+        ).all()
+        return json_app.dumps({'data': [serializar_linha(row) for row in rows], 'total': total})
+
+    print(f'{"per_page":>8} {"modo":<9} {"p50":>9} {"p99":>9} {"CPU/req":>9}')
+    with app.app_context():
+        for per_page in (100, 500):
+            paginas = max(args.linhas // per_page, 1)
+            for nome, funcao in (('original', original), ('novo', novo)):
+                tempos = []
+                cpu_inicio = time.process_time()
+                for i in range(args.repeticoes):
+                    inicio = time.perf_counter()
+                    funcao(i % paginas + 1, per_page)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                    db.session.remove()
+                cpu = (time.process_time() - cpu_inicio) * 1000 / args.repeticoes
+                print(f'{per_page:>8} {nome:<9} {percentil(tempos, 50):>6.2f} ms '
+                      f'{percentil(tempos, 99):>6.2f} ms {cpu:>6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
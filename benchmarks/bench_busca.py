@@ -0,0 +1,67 @@
+"""
+Benchmark da busca de linhas: LIKE em 7 colunas (original) x filtro_busca
+
+Uso:
+    python benchmarks/bench_busca.py [--linhas 100000] [--database-url URL]
+
+Sem --database-url usa um SQLite temporário (no SQLite o texto livre continua
+em LIKE; o caminho FULLTEXT só é exercitado apontando para um MySQL).
+"""
+
+import argparse
+import os
+import tempfile
+
+from comum import popular_linhas, cronometrar, percentil
+
+from sqlalchemy import create_engine, select, func
+
+
+TERMOS = [
+    '11900001234',       # telefone completo
+    '(21) 9000',         # prefixo formatado
+    '1000042',           # conta
+    'Ativa',             # status
+    'Silva',             # texto livre
+    'Empresarial 50GB',  # texto livre com várias palavras
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    from app import Linha, filtro_busca, filtro_busca_like
+
+    url = args.database_url
+    if not url:
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_busca.db')
+    engine = create_engine(url)
+
+    print(f'Populando {args.linhas} linhas em {engine.dialect.name}...')
+    popular_linhas(engine, args.linhas)
+
+    def consulta(filtro):
+        # Mesmo formato da listagem: primeira página + COUNT(*)
+        pagina = select(Linha.__table__).where(filtro).order_by(Linha.id.desc()).limit(10)
+        total = select(func.count()).select_from(Linha.__table__).where(filtro)
+
+        def executar():
+            with engine.connect() as conn:
+                conn.execute(pagina).fetchall()
+                conn.execute(total).scalar()
+        return executar
+
+    print(f'{"termo":<20} {"original p50":>14} {"novo p50":>10} {"ganho":>8}')
+    for termo in TERMOS:
+        antigo = cronometrar(consulta(filtro_busca_like(termo)), args.repeticoes)
+        novo = cronometrar(consulta(filtro_busca(termo, engine.dialect.name)), args.repeticoes)
+        p50_antigo, p50_novo = percentil(antigo, 50), percentil(novo, 50)
+        print(f'{termo:<20} {p50_antigo:>11.2f} ms {p50_novo:>7.2f} ms {p50_antigo / p50_novo:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+"""
+Teste de carga das rotas principais contra o servidor real (gunicorn)
+
+Popula um banco com N linhas, sobe o gunicorn com gunicorn.conf.py e dispara
+clientes HTTP concorrentes (cada um com sua sessão logada) contra /login,
+/dashboard, /linhas?search=, /api/linhas, /api/dashboard/stats e as duas
+exportações. Reporta req/s, p50/p95/p99 por cenário e o pico de RSS do
+servidor (master + workers) em JSON. Com --comparar, mostra a variação em
+relação a um baseline salvo e termina com código 1 se houver regressão.
+
+Uso:
+    python benchmarks/bench_carga.py --linhas 100000 --saida baseline.json
+    python benchmarks/bench_carga.py --linhas 100000 --comparar baseline.json
+    python benchmarks/bench_carga.py --banco mysql+pymysql://u:s@host/db --sem-popular
+
+Por padrão usa SQLite em um diretório temporário. --banco aceita qualquer URL
+do SQLAlchemy (o banco é recriado, a menos que --sem-popular seja usado).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from comum import RAIZ, percentil, popular_linhas
+
+RE_CSRF = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+# nome -> (método, caminho); exportações usam --clientes-exportacao
+CENARIOS = {
+    'login': ('POST', '/login'),
+    'dashboard': ('GET', '/dashboard'),
+    'linhas_busca': ('GET', '/linhas?search={busca}'),
+    'api_linhas': ('GET', '/api/linhas?page=1&per_page=50'),
+    'api_stats': ('GET', '/api/dashboard/stats'),
+    'exportar_csv': ('GET', '/exportar/linhas/csv'),
+    'exportar_excel': ('GET', '/exportar/linhas/excel'),
+}
+CENARIOS_EXPORTACAO = {'exportar_csv', 'exportar_excel'}
+
+
+class Cliente:
+    """Conexão keep-alive com cookies de sessão (um por thread)"""
+
+    def __init__(self, porta):
+        self.conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=600)
+        self.cookies = {}
+        self.token = ''
+
+    def requisitar(self, metodo, caminho, dados=None):
+        cabecalhos = {}
+        if self.cookies:
+            cabecalhos['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        corpo = None
+        if dados is not None:
+            corpo = urlencode(dados)
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+        resposta = self.conexao.getresponse()
+        conteudo = resposta.read()
+        for cabecalho in resposta.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(cabecalho)
+            for nome, morsel in cookie.items():
+                self.cookies[nome] = morsel.value
+        return resposta.status, conteudo
+
+    def logar(self, usuario, senha):
+        _, pagina = self.requisitar('GET', '/login')
+        encontrado = RE_CSRF.search(pagina.decode('utf-8', 'replace'))
+        self.token = encontrado.group(1) if encontrado else ''
+        return self.requisitar('POST', '/login', self.dados_login(usuario, senha))
+
+    def dados_login(self, usuario, senha):
+        return {'nome': usuario, 'senha': senha, 'csrf_token': self.token}
+
+
+class MonitorRSS:
+    """Amostra o RSS somado do processo e dos filhos (workers) e guarda o pico"""
+
+    def __init__(self, pid, intervalo=0.2):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico_kb = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+
+    @staticmethod
+    def _rss_kb(pid):
+        try:
+            with open(f'/proc/{pid}/status') as arquivo:
+                for linha in arquivo:
+                    if linha.startswith('VmRSS:'):
+                        return int(linha.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _filhos(self):
+        filhos = []
+        try:
+            for tarefa in os.listdir(f'/proc/{self.pid}/task'):
+                with open(f'/proc/{self.pid}/task/{tarefa}/children') as arquivo:
+                    filhos.extend(int(pid) for pid in arquivo.read().split())
+        except OSError:
+            pass
+        return filhos
+
+    def _executar(self):
+        while not self._parar.is_set():
+            total = self._rss_kb(self.pid) + sum(self._rss_kb(pid) for pid in self._filhos())
+            self.pico_kb = max(self.pico_kb, total)
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def preparar_banco(url, linhas):
+    """Recria o banco com `linhas` registros e roda o init-db (admin, rollups, lookups)"""
+    from sqlalchemy import create_engine
+
+    os.environ['DATABASE_URL'] = url
+    engine = create_engine(url)
+    inicio = time.perf_counter()
+    popular_linhas(engine, linhas)
+    engine.dispose()
+
+    from app import create_app, init_db
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'VENCIMENTOS_INTERVALO': 0})
+    with app.app_context():
+        init_db()
+    print(f'banco populado com {linhas} linhas em {time.perf_counter() - inicio:.1f}s')
+
+
+def subir_servidor(url, porta, args, pasta):
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL=url,
+        PORT=str(porta),
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_LOG_LEVEL='warning',
+        # Sem reciclagem de workers durante a medição
+        GUNICORN_MAX_REQUESTS='0',
+        EXPORT_CACHE_DIR=os.path.join(pasta, 'cache-exportacoes'),
+        EXPORT_SPOOL_DIR=os.path.join(pasta, 'spool'),
+    )
+    ambiente.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if args.sem_cache_exportacao:
+        ambiente['EXPORT_CACHE_SIZE'] = '0'
+    if args.sem_cache_fragmentos:
+        ambiente['LINHAS_FRAGMENT_CACHE_SIZE'] = '0'
+
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull, 'wsgi:app'],
+        cwd=RAIZ, env=ambiente
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', '/teste')
+            conexao.getresponse().read()
+            return processo
+        except OSError:
+            if processo.poll() is not None:
+                raise SystemExit('gunicorn terminou antes de aceitar conexões')
+            time.sleep(0.2)
+    processo.terminate()
+    raise SystemExit('gunicorn não respondeu em 60s')
+
+
+def executar_cenario(nome, porta, clientes, duracao, args):
+    metodo, caminho = CENARIOS[nome]
+    caminho = caminho.format(busca=args.busca)
+    # Login bem-sucedido redireciona; nas demais rotas um 302 indica erro (flash + redirect)
+    status_ok = 302 if metodo == 'POST' else 200
+    tempos = []
+    erros = [0]
+    total_bytes = [0]
+    lock = threading.Lock()
+
+    def trabalhar():
+        cliente = Cliente(porta)
+        status, _ = cliente.logar(args.usuario, args.senha)
+        if status != 302:
+            with lock:
+                erros[0] += 1
+            return
+        dados = cliente.dados_login(args.usuario, args.senha) if metodo == 'POST' else None
+        fim = time.monotonic() + duracao
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                status, conteudo = cliente.requisitar(metodo, caminho, dados)
+            except (OSError, http.client.HTTPException):
+                status, conteudo = 0, b''
+                cliente = Cliente(porta)
+                cliente.logar(args.usuario, args.senha)
+            tempo = (time.perf_counter() - inicio) * 1000
+            with lock:
+                if status != status_ok:
+                    erros[0] += 1
+                else:
+                    tempos.append(tempo)
+                    total_bytes[0] += len(conteudo)
+
+    threads = [threading.Thread(target=trabalhar) for _ in range(clientes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+
+    return {
+        'clientes': clientes,
+        'requisicoes': len(tempos),
+        'erros': erros[0],
+        'req_s': round(len(tempos) / decorrido, 2),
+        'p50_ms': round(percentil(tempos, 50), 2),
+        'p95_ms': round(percentil(tempos, 95), 2),
+        'p99_ms': round(percentil(tempos, 99), 2),
+        'bytes_medio': int(total_bytes[0] / len(tempos)) if tempos else 0,
+    }
+
+
+def comparar(atual, baseline, tolerancia):
+    """Imprime as variações e devolve a lista de regressões acima da tolerância (%)"""
+    regressoes = []
+    print(f'\n{"cenário":<16} {"req/s":>10} {"Δ":>8} {"p95 ms":>10} {"Δ":>8}')
+    for nome, dados in atual['cenarios'].items():
+        anterior = baseline.get('cenarios', {}).get(nome)
+        if not anterior:
+            print(f'{nome:<16} {dados["req_s"]:>10.1f} {"novo":>8}')
+            continue
+        delta_vazao = (dados['req_s'] / anterior['req_s'] - 1) * 100 if anterior['req_s'] else 0.0
+        delta_p95 = (dados['p95_ms'] / anterior['p95_ms'] - 1) * 100 if anterior['p95_ms'] else 0.0
+        print(f'{nome:<16} {dados["req_s"]:>10.1f} {delta_vazao:>+7.1f}% '
+              f'{dados["p95_ms"]:>10.1f} {delta_p95:>+7.1f}%')
+        if delta_vazao < -tolerancia or delta_p95 > tolerancia:
+            regressoes.append(nome)
+
+    if baseline.get('rss_pico_mb'):
+        delta_rss = (atual['rss_pico_mb'] / baseline['rss_pico_mb'] - 1) * 100
+        print(f'{"RSS pico (MB)":<16} {atual["rss_pico_mb"]:>10.1f} {delta_rss:>+7.1f}%')
+        if delta_rss > tolerancia:
+            regressoes.append('rss_pico_mb')
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=10000, help='linhas no banco (1k a 1M)')
+    parser.add_argument('--banco', help='URL do SQLAlchemy (padrão: SQLite temporário)')
+    parser.add_argument('--sem-popular', action='store_true', help='usa o banco como está')
+    parser.add_argument('--cenarios', nargs='+', choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--clientes-exportacao', type=int, default=2)
+    parser.add_argument('--duracao', type=float, default=10, help='segundos por cenário')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--busca', default='Silva')
+    parser.add_argument('--usuario', default='admin')
+    parser.add_argument('--senha', default='admin123')
+    parser.add_argument('--sem-cache-exportacao', action='store_true',
+                        help='gera cada exportação do zero (EXPORT_CACHE_SIZE=0)')
+    parser.add_argument('--sem-cache-fragmentos', action='store_true',
+                        help='renderiza a tabela de /linhas a cada requisição (LINHAS_FRAGMENT_CACHE_SIZE=0)')
+    parser.add_argument('--saida', help='grava o resultado em JSON (ex.: baseline.json)')
+    parser.add_argument('--comparar', help='baseline JSON para comparação')
+    parser.add_argument('--tolerancia', type=float, default=10, help='regressão tolerada (%%)')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_carga_')
+    url = args.banco or 'sqlite:///' + os.path.join(pasta, 'bench_carga.db')
+    if not args.sem_popular:
+        preparar_banco(url, args.linhas)
+
+    porta = porta_livre()
+    servidor = subir_servidor(url, porta, args, pasta)
+    monitor = MonitorRSS(servidor.pid)
+    monitor.iniciar()
+
+    cenarios = {}
+    try:
+        print(f'{"cenário":<16} {"req/s":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"erros":>6}')
+        for nome in args.cenarios:
+            clientes = args.clientes_exportacao if nome in CENARIOS_EXPORTACAO else args.clientes
+            dados = executar_cenario(nome, porta, clientes, args.duracao, args)
+            cenarios[nome] = dados
+            print(f'{nome:<16} {dados["req_s"]:>8.1f} {dados["p50_ms"]:>6.1f} ms '
+                  f'{dados["p95_ms"]:>6.1f} ms {dados["p99_ms"]:>6.1f} ms {dados["erros"]:>6}')
+    finally:
+        monitor.parar()
+        servidor.terminate()
+        servidor.wait(timeout=60)
+
+    resultado = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {
+            'linhas': args.linhas,
+            'banco': url.split(':', 1)[0],
+            'clientes': args.clientes,
+            'clientes_exportacao': args.clientes_exportacao,
+            'duracao': args.duracao,
+            'workers': args.workers,
+            'threads': args.threads,
+            'busca': args.busca,
+            'cache_exportacao': not args.sem_cache_exportacao,
+            'cache_fragmentos': not args.sem_cache_fragmentos,
+        },
+        'cenarios': cenarios,
+        'rss_pico_mb': round(monitor.pico_kb / 1024, 1),
+    }
+    print(f'RSS pico do servidor: {resultado["rss_pico_mb"]} MB')
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f'resultado gravado em {args.saida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)
+        if baseline.get('parametros') != resultado['parametros']:
+            print('aviso: parâmetros diferentes do baseline; a comparação pode não ser justa')
+        regressoes = comparar(resultado, baseline, args.tolerancia)
+        if regressoes:
+            print(f'regressões acima de {args.tolerancia}%: {", ".join(regressoes)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark da exportação Excel: pandas + ExcelWriter (original) x openpyxl write-only
+
+Mede tempo e pico de RSS para 10k/100k/500k linhas. Cada medição roda em um
+processo separado para que o pico de memória de uma não contamine a outra.
+
+Uso:
+    python benchmarks/bench_exportacao_excel.py [--linhas 10000 100000 500000]
+
+O modo original só é medido se o pandas estiver instalado.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from comum import popular_linhas
+
+
+def exportar_original(destino):
+    """Cópia da implementação anterior (lista de dicts -> DataFrame -> ExcelWriter)"""
+    import pandas as pd
+    from app import Linha, formatar_telefone_para_exibicao, formatar_moeda_br
+
+    linhas = Linha.query.order_by(Linha.id).all()
+    dados = []
+    for linha in linhas:
+        dados.append({
+            'ID': linha.id,
+            'Conta': linha.conta,
+            'Linha Telefônica': formatar_telefone_para_exibicao(linha.linha),
+            'Plano': linha.plano,
+            'Mensalidade': f"R$ {formatar_moeda_br(linha.mensalidade)}",
+            'Responsável': linha.responsavel,
+            'Departamento': linha.departamento,
+            'Chipeira': linha.chipeira,
+            'Data de Efetivação': linha.efetivacao.strftime('%d/%m/%Y') if linha.efetivacao else '',
+            'Data de Término': linha.termino.strftime('%d/%m/%Y') if linha.termino else '',
+            'Status': linha.status,
+            'Em Uso': linha.uso,
+            'Fase': linha.fase or ''
+        })
+    df = pd.DataFrame(dados)
+    with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Linhas Telefônicas', index=False)
+        worksheet = writer.sheets['Linhas Telefônicas']
+        for column in worksheet.columns:
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+
+
+def exportar_novo(destino):
+    from app import consultar_linhas_exportacao, gerar_excel
+    gerar_excel(consultar_linhas_exportacao(), destino)
+
+
+def medir(modo):
+    """Executado no processo filho: roda uma exportação e imprime o resultado em JSON"""
+    from app import create_app
+    app = create_app()
+
+    funcao = exportar_original if modo == 'original' else exportar_novo
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with app.app_context(), tempfile.TemporaryFile() as destino:
+        inicio = time.perf_counter()
+        funcao(destino)
+        duracao = time.perf_counter() - inicio
+        tamanho = destino.tell()
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'segundos': round(duracao, 2),
+        'rss_pico_mb': round(rss_pico / 1024, 1),
+        'rss_export_mb': round((rss_pico - rss_inicial) / 1024, 1),
+        'arquivo_mb': round(tamanho / 1024 / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--medir', choices=['original', 'novo'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir(args.medir)
+        return
+
+    try:
+        import pandas  # noqa: F401
+        modos = ['original', 'novo']
+    except ImportError:
+        print('pandas não instalado: medindo apenas o modo novo')
+        modos = ['novo']
+
+    from sqlalchemy import create_engine
+
+    pasta = tempfile.mkdtemp()
+    print(f'{"linhas":>8} {"modo":<9} {"tempo":>8} {"RSS pico":>10} {"RSS export":>11}')
+    for quantidade in args.linhas:
+        url = 'sqlite:///' + os.path.join(pasta, f'excel_{quantidade}.db')
+        popular_linhas(create_engine(url), quantidade)
+        env = dict(os.environ, DATABASE_URL=url)
+        for modo in modos:
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--medir', modo],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            r = json.loads(saida.strip().splitlines()[-1])
+            print(f'{quantidade:>8} {modo:<9} {r["segundos"]:>7.2f}s {r["rss_pico_mb"]:>7.1f} MB '
+                  f'{r["rss_export_mb"]:>8.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
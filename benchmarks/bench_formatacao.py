@@ -0,0 +1,127 @@
+"""
+Micro-benchmark das funções de formatação (implementação anterior x formatacao.py)
+
+Mostra o custo por chamada em três cenários:
+- original: funções como estavam em app.py
+- novo (sem cache): formatacao.py chamando a função sem o LRU
+- novo (com cache): formatacao.py com o LRU aquecido (valores repetidos)
+
+Uso:
+    python benchmarks/bench_formatacao.py [--numero 200000]
+"""
+
+import argparse
+import random
+import timeit
+from datetime import datetime, date
+from decimal import Decimal
+
+import comum  # noqa: F401  (ajusta o sys.path)
+import formatacao
+
+
+# ---------- Implementações anteriores (cópia de app.py) ----------
+def telefone_original(telefone):
+    if not telefone:
+        return ''
+    numeros = ''.join(filter(str.isdigit, str(telefone)))
+    if len(numeros) == 11:
+        return f'({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}'
+    elif len(numeros) == 10:
+        return f'({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}'
+    elif len(numeros) == 9:
+        return f'{numeros[:5]}-{numeros[5:]}'
+    elif len(numeros) == 8:
+        return f'{numeros[:4]}-{numeros[4:]}'
+    else:
+        return telefone
+
+
+def limpar_original(telefone_formatado):
+    if not telefone_formatado:
+        return ''
+    return ''.join(filter(str.isdigit, str(telefone_formatado)))
+
+
+def moeda_original(value):
+    try:
+        if value is None:
+            return '0,00'
+        if isinstance(value, str):
+            clean_value = value.replace('R$', '').replace(' ', '').strip()
+            if clean_value == '':
+                return '0,00'
+            value = float(clean_value.replace(',', '.'))
+        elif not isinstance(value, (int, float)):
+            value = float(value)
+        formatted = f"{value:,.2f}"
+        if '.' in formatted and ',' in formatted:
+            return formatted.replace(',', 'X').replace('.', ',').replace('X', '.')
+        elif '.' in formatted:
+            return formatted.replace('.', ',')
+        else:
+            return f"{value},00"
+    except (ValueError, TypeError):
+        return '0,00'
+
+
+def data_original(value, format='%d/%m/%Y'):
+    if value is None:
+        return '-'
+    if isinstance(value, str):
+        for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S'):
+            try:
+                value = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+    if isinstance(value, (datetime, date)):
+        return value.strftime(format)
+    return str(value)
+
+
+def medir(funcao, valores, numero):
+    total = len(valores)
+    contador = iter(range(numero))
+
+    def chamar():
+        funcao(valores[next(contador) % total])
+
+    segundos = timeit.timeit(chamar, number=numero)
+    return segundos / numero * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--numero', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    telefones = [f'{rnd.randint(11, 99)}9{rnd.randint(0, 99999999):08d}' for _ in range(2000)]
+    formatados = [f'({t[:2]}) {t[2:7]}-{t[7:]}' for t in telefones]
+    mensalidades = [Decimal(f'{rnd.choice([49.9, 79.9, 99.9, 129.9, 1249.9]):.2f}') for _ in range(2000)]
+    datas = [date(2024, rnd.randint(1, 12), rnd.randint(1, 28)) for _ in range(2000)]
+    datas_texto = [d.strftime(rnd.choice(['%Y-%m-%d', '%d/%m/%Y'])) for d in datas]
+
+    casos = [
+        ('limpar_telefone', limpar_original, formatacao.limpar_telefone, None, formatados),
+        ('formatar_telefone', telefone_original, formatacao.formatar_telefone.__wrapped__,
+         formatacao.formatar_telefone, telefones),
+        ('formatar_moeda (Decimal)', moeda_original, formatacao.formatar_moeda.__wrapped__,
+         formatacao.formatar_moeda, mensalidades),
+        ('format_date (date)', data_original, formatacao.formatar_data.__wrapped__,
+         formatacao.formatar_data, datas),
+        ('format_date (texto)', data_original, formatacao.formatar_data.__wrapped__,
+         formatacao.formatar_data, datas_texto),
+    ]
+
+    print(f'{"função":<26} {"original":>10} {"sem cache":>10} {"com cache":>10}   (ns/chamada)')
+    for nome, original, novo, com_cache, valores in casos:
+        t_original = medir(original, valores, args.numero)
+        t_novo = medir(novo, valores, args.numero)
+        t_cache = medir(com_cache, valores, args.numero) if com_cache else float('nan')
+        print(f'{nome:<26} {t_original:>10.0f} {t_novo:>10.0f} {t_cache:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
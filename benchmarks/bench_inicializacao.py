@@ -0,0 +1,97 @@
+"""
+Benchmark de inicialização: tempo de import + create_app e RSS de um worker
+
+Cada medição roda num processo Python novo (como um worker do gunicorn
+recém-criado). O cenário "openpyxl_no_topo" carrega o openpyxl antes da
+aplicação, reproduzindo o custo dos imports no topo do app.py, para comparar
+com o import tardio (só nas rotas de Excel).
+
+Uso:
+    python benchmarks/bench_inicializacao.py [--repeticoes 10] [--saida inicio.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from comum import RAIZ, percentil
+
+CODIGO = '''
+import json, sys, time
+inicio = time.perf_counter()
+{pre_import}
+from app import create_app
+create_app()
+duracao = time.perf_counter() - inicio
+with open('/proc/self/status') as status:
+    rss = next(int(l.split()[1]) for l in status if l.startswith('VmRSS:'))
+print(json.dumps({{
+    'segundos': duracao,
+    'rss_kb': rss,
+    'modulos': len(sys.modules),
+    'openpyxl': 'openpyxl' in sys.modules,
+}}))
+'''
+
+CENARIOS = {
+    'import_tardio': '',
+    'openpyxl_no_topo': 'import openpyxl, openpyxl.utils',
+}
+
+
+def medir(cenario, ambiente):
+    codigo = CODIGO.format(pre_import=CENARIOS[cenario])
+    saida = subprocess.run(
+        [sys.executable, '-c', codigo], cwd=RAIZ, env=ambiente,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--cenarios', nargs='+', choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--saida', help='grava o resultado em JSON')
+    args = parser.parse_args()
+
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_inicio.db'),
+        # Sem thread de vencimentos: mede só a inicialização
+        VENCIMENTOS_INTERVALO='0',
+    )
+    ambiente.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    # Aquece o cache de bytecode/disco para não contar a primeira compilação
+    medir(args.cenarios[0], ambiente)
+
+    print(f'{"cenário":<18} {"p50":>9} {"p95":>9} {"RSS":>9} {"módulos":>8} openpyxl')
+    resultado = {'repeticoes': args.repeticoes, 'cenarios': {}}
+    for cenario in args.cenarios:
+        medicoes = [medir(cenario, ambiente) for _ in range(args.repeticoes)]
+        tempos = [m['segundos'] * 1000 for m in medicoes]
+        rss_mb = statistics.median(m['rss_kb'] for m in medicoes) / 1024
+        dados = {
+            'p50_ms': round(percentil(tempos, 50), 1),
+            'p95_ms': round(percentil(tempos, 95), 1),
+            'rss_mb': round(rss_mb, 1),
+            'modulos': medicoes[-1]['modulos'],
+            'openpyxl_carregado': medicoes[-1]['openpyxl'],
+        }
+        resultado['cenarios'][cenario] = dados
+        print(f'{cenario:<18} {dados["p50_ms"]:>6.1f} ms {dados["p95_ms"]:>6.1f} ms '
+              f'{dados["rss_mb"]:>6.1f} MB {dados["modulos"]:>8} {"sim" if dados["openpyxl_carregado"] else "não"}')
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f'resultado gravado em {args.saida}')
+
+
+if __name__ == '__main__':
+    main()
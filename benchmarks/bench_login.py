@@ -0,0 +1,86 @@
+"""
+Benchmark de login: vazão e latência com vários níveis de concorrência
+
+Cada cliente faz logins seguidos enquanto outra thread consulta
+/api/dashboard/stats, para mostrar quanto o pico de logins atrasa as demais
+requisições do worker. Rode com PASSWORD_HASH_WORKERS / PASSWORD_HASH_METHOD
+diferentes para comparar configurações.
+
+Uso:
+    python benchmarks/bench_login.py [--concorrencia 1 4 8 16] [--logins 20]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from comum import percentil
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concorrencia', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--logins', type=int, default=20, help='logins por cliente')
+    args = parser.parse_args()
+
+    url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+    os.environ['DATABASE_URL'] = url
+
+    from app import create_app, init_db
+    import senhas
+
+    app = create_app({'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        init_db()
+
+    # Cliente autenticado que mede a latência das outras rotas durante o pico
+    observador = app.test_client()
+    observador.post('/login', data={'nome': 'admin', 'senha': 'admin123'})
+
+    print(f'método: {senhas.METODO_HASH}  pool de hash: {senhas.HASH_WORKERS} threads')
+    print(f'{"clientes":>8} {"logins/s":>9} {"login p50":>10} {"login p95":>10} {"stats p95":>10}')
+
+    for clientes in args.concorrencia:
+        tempos_login = []
+        tempos_stats = []
+        lock = threading.Lock()
+        parar = threading.Event()
+
+        def logar():
+            cliente = app.test_client()
+            for _ in range(args.logins):
+                inicio = time.perf_counter()
+                resposta = cliente.post('/login', data={'nome': 'admin', 'senha': 'admin123'})
+                duracao = (time.perf_counter() - inicio) * 1000
+                assert resposta.status_code == 302, resposta.status_code
+                with lock:
+                    tempos_login.append(duracao)
+
+        def observar():
+            while not parar.is_set():
+                inicio = time.perf_counter()
+                observador.get('/api/dashboard/stats')
+                tempos_stats.append((time.perf_counter() - inicio) * 1000)
+                time.sleep(0.01)
+
+        thread_obs = threading.Thread(target=observar)
+        thread_obs.start()
+        threads = [threading.Thread(target=logar) for _ in range(clientes)]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - inicio
+        parar.set()
+        thread_obs.join()
+
+        print(f'{clientes:>8} {len(tempos_login) / duracao:>9.1f} '
+              f'{percentil(tempos_login, 50):>7.0f} ms {percentil(tempos_login, 95):>7.0f} ms '
+              f'{percentil(tempos_stats, 95):>7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Utilitários compartilhados pelos benchmarks
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# Permite executar `python benchmarks/<script>.py` a partir da raiz do projeto
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+DEPARTAMENTOS = ['TI', 'RH', 'Financeiro', 'Comercial', 'Logística', 'Jurídico',
+                 'Marketing', 'Compras', 'Diretoria', 'Operações']
+PLANOS = ['Smart 10GB', 'Smart 20GB', 'Controle 5GB', 'Empresarial 50GB', 'Dados 100GB']
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+         'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Peixoto']
+STATUS = ['Ativa'] * 8 + ['A Cancelar', 'Cancelada']
+
+
+def gerar_linhas(quantidade, semente=42):
+    """Gera dicionários de linhas com dados realistas e determinísticos"""
+    rnd = random.Random(semente)
+    inicio = date(2020, 1, 1)
+    for i in range(quantidade):
+        efetivacao = inicio + timedelta(days=rnd.randint(0, 1800))
+        yield {
+            'conta': f'{rnd.randint(1000000, 1000099)}',
+            'linha': f'{rnd.randint(11, 99)}9{i:08d}',
+            'plano': rnd.choice(PLANOS),
+            'mensalidade': round(rnd.uniform(29.9, 249.9), 2),
+            'responsavel': f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}',
+            'departamento': rnd.choice(DEPARTAMENTOS),
+            'chipeira': rnd.choice(['Sim', 'Não']),
+            'efetivacao': efetivacao,
+            'termino': efetivacao + timedelta(days=rnd.choice([365, 730, 1095])),
+            'status': rnd.choice(STATUS),
+            'uso': rnd.choice(['Sim', 'Não']),
+            'fase': rnd.choice(['', '', 'Portabilidade', 'Ativação', 'Troca de chip']),
+        }
+
+
+def popular_linhas(engine, quantidade, lote=5000):
+    """Recria as tabelas no engine informado e insere `quantidade` linhas"""
+    from app import db, Linha, preencher_lookups
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+
+    tabela = Linha.__table__
+    buffer = []
+    with engine.begin() as conn:
+        for registro in gerar_linhas(quantidade):
+            buffer.append(registro)
+            if len(buffer) >= lote:
+                conn.execute(tabela.insert(), buffer)
+                buffer = []
+        if buffer:
+            conn.execute(tabela.insert(), buffer)
+        preencher_lookups(conn)
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa `funcao` N vezes e devolve a lista de tempos em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
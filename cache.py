@@ -0,0 +1,207 @@
+"""
+Caches em memória do processo (compartilhados entre as threads do worker)
+e em disco (arquivos de exportação)
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import time
+
+
+class SnapshotCache:
+    """Guarda um único valor calculado, válido por `ttl` segundos.
+
+    Enquanto o snapshot estiver válido, `obter()` devolve o valor guardado
+    sem chamar `carregar`. `invalidar()` força o recálculo na próxima leitura.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._valor = None
+        self._expira_em = 0.0
+        # Incrementada a cada invalidação (ver atualizar)
+        self._geracao = 0
+
+    def obter(self, carregar):
+        agora = time.monotonic()
+        if self._valor is not None and agora < self._expira_em:
+            return self._valor
+
+        with self._lock:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock
+            agora = time.monotonic()
+            if self._valor is not None and agora < self._expira_em:
+                return self._valor
+
+            valor = carregar()
+            self._valor = valor
+            self._expira_em = agora + self.ttl
+            return valor
+
+    def atualizar(self, carregar):
+        """Recalcula o valor imediatamente (ex.: a partir de um agendador).
+
+        O cálculo roda fora do lock; se houve uma invalidação durante ele, o
+        valor (possivelmente anterior à alteração) é devolvido mas não guardado.
+        """
+        geracao = self._geracao
+        valor = carregar()
+        with self._lock:
+            if self._geracao == geracao:
+                self._valor = valor
+                self._expira_em = time.monotonic() + self.ttl
+        return valor
+
+    def invalidar(self):
+        with self._lock:
+            self._geracao += 1
+            self._valor = None
+            self._expira_em = 0.0
+
+
+class CacheTTL:
+    """Cache LRU por chave com expiração (`ttl` segundos) e tamanho máximo"""
+
+    _AUSENTE = object()
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dados = OrderedDict()
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            item = self._dados.get(chave, self._AUSENTE)
+            if item is self._AUSENTE:
+                return padrao
+            valor, expira_em = item
+            if time.monotonic() >= expira_em:
+                del self._dados[chave]
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + self.ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+
+class CacheBytes:
+    """Cache LRU por chave limitado pela quantidade de itens e pelo total de bytes.
+
+    `definir` recebe o tamanho do valor; os menos usados saem até caber
+    em `max_bytes`. Valores maiores que o limite não são guardados.
+    """
+
+    def __init__(self, maxsize, max_bytes):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._dados = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._dados)
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return padrao
+            self._dados.move_to_end(chave)
+            return item[0]
+
+    def definir(self, chave, valor, tamanho):
+        if tamanho > self.max_bytes or self.maxsize <= 0:
+            return
+        with self._lock:
+            anterior = self._dados.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._dados[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while len(self._dados) > self.maxsize or self._bytes > self.max_bytes:
+                _, (_, removido) = self._dados.popitem(last=False)
+                self._bytes -= removido
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self._bytes = 0
+
+
+class CacheArquivos:
+    """Arquivos gerados guardados em disco por chave, mantendo os `maxsize` mais recentes.
+
+    A pasta pode ser compartilhada entre os workers: cada arquivo é gravado
+    com outro nome e só aparece (os.replace) quando estiver completo.
+    """
+
+    def __init__(self, pasta, maxsize):
+        self.pasta = pasta
+        self.maxsize = maxsize
+
+    def _caminho(self, chave):
+        nome = hashlib.sha1(repr(chave).encode('utf-8')).hexdigest()
+        return os.path.join(self.pasta, nome)
+
+    def obter(self, chave):
+        """Caminho do arquivo da chave, ou None se não estiver em cache"""
+        caminho = self._caminho(chave)
+        try:
+            os.utime(caminho)  # Marca como usado recentemente
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    @contextmanager
+    def gravar(self, chave):
+        """Abre o arquivo da chave para escrita; descartado se o bloco falhar"""
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self._caminho(chave)
+        parcial = f'{caminho}.{uuid.uuid4().hex}.parcial'
+        try:
+            with open(parcial, 'wb') as destino:
+                yield destino
+        except BaseException:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+        os.replace(parcial, caminho)
+        self._podar()
+
+    def _podar(self):
+        try:
+            arquivos = [
+                entrada for entrada in os.scandir(self.pasta)
+                if entrada.is_file() and not entrada.name.endswith('.parcial')
+            ]
+        except FileNotFoundError:
+            return
+        arquivos.sort(key=lambda entrada: entrada.stat().st_mtime, reverse=True)
+        for entrada in arquivos[self.maxsize:]:
+            try:
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,133 @@
+"""
+Formatação de telefone, moeda e datas no padrão brasileiro
+
+Usado pela listagem, API, templates e exportações. Os valores se repetem
+muito entre linhas (planos, mensalidades, datas), por isso as funções de
+exibição guardam os últimos resultados em um LRU.
+"""
+
+import logging
+from datetime import datetime, date
+from decimal import Decimal
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_CACHE = 8192
+
+
+class _TabelaDigitos(dict):
+    """Tabela para str.translate que mantém apenas os dígitos 0-9"""
+
+    def __missing__(self, codigo):
+        self[codigo] = None
+        return None
+
+
+_APENAS_DIGITOS = _TabelaDigitos((ord(d), ord(d)) for d in '0123456789')
+
+# Troca os separadores do formato americano (1,234.56) pelo brasileiro (1.234,56)
+_SEPARADORES_BR = str.maketrans(',.', '.,')
+
+
+def limpar_telefone(telefone_formatado):
+    """Remove formatação do telefone, deixando apenas números"""
+    if not telefone_formatado:
+        return ''
+    texto = str(telefone_formatado)
+    # Caso comum: o banco já armazena apenas números
+    if texto.isascii() and texto.isdigit():
+        return texto
+    return texto.translate(_APENAS_DIGITOS)
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def formatar_telefone(telefone):
+    """Formata o telefone para exibição (XX) XXXXX-XXXX"""
+    if not telefone:
+        return ''
+
+    numeros = limpar_telefone(telefone)
+    tamanho = len(numeros)
+
+    if tamanho == 11:  # Celular com DDD
+        return f'({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}'
+    elif tamanho == 10:  # Telefone fixo com DDD
+        return f'({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}'
+    elif tamanho == 9:  # Celular sem DDD
+        return f'{numeros[:5]}-{numeros[5:]}'
+    elif tamanho == 8:  # Telefone fixo sem DDD
+        return f'{numeros[:4]}-{numeros[4:]}'
+    else:
+        return telefone
+
+
+def _converter_moeda(valor):
+    """Converte str/int/float/Decimal em número (ValueError se inválido)"""
+    if isinstance(valor, str):
+        texto = valor.replace('R$', '').replace(' ', '')
+        if not texto:
+            return 0
+        if ',' in texto:
+            # Formato brasileiro: 1.234,56
+            texto = texto.replace('.', '').replace(',', '.')
+        return Decimal(texto)
+    if isinstance(valor, (int, float, Decimal)):
+        return valor
+    return float(valor)
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def formatar_moeda(valor):
+    """Formata valores monetários no formato brasileiro (48,08 / 1.234,56)"""
+    if valor is None:
+        return '0,00'
+    try:
+        return f'{_converter_moeda(valor):,.2f}'.translate(_SEPARADORES_BR)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        logger.warning('Erro ao formatar moeda: %s, valor: %r', e, valor)
+        return '0,00'
+
+
+def _converter_data_texto(texto):
+    """Interpreta as datas em texto aceitas pelo sistema (None se não reconhecer)"""
+    try:
+        if len(texto) == 10:
+            if texto[4] == '-' and texto[7] == '-':  # 2024-01-31
+                return date(int(texto[:4]), int(texto[5:7]), int(texto[8:]))
+            if texto[2] == '/' and texto[5] == '/':  # 31/01/2024 ou 01/31/2024
+                dia, mes, ano = int(texto[:2]), int(texto[3:5]), int(texto[6:])
+                try:
+                    return date(ano, mes, dia)
+                except ValueError:
+                    return date(ano, dia, mes)
+        elif len(texto) == 19 and texto[4] == '-' and texto[10] == ' ':  # 2024-01-31 12:00:00
+            return datetime.strptime(texto, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        pass
+
+    # Formatos com dia/mês sem zero à esquerda etc.
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(texto, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def formatar_data(valor, formato='%d/%m/%Y', vazio='-'):
+    """Formata datas (date, datetime ou texto) no formato brasileiro"""
+    if valor is None:
+        return vazio
+
+    if isinstance(valor, str):
+        convertido = _converter_data_texto(valor)
+        if convertido is None:
+            return valor
+        valor = convertido
+
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime(formato)
+
+    return str(valor)
@@ -0,0 +1,56 @@
+"""
+Configuração do gunicorn (valores ajustáveis por variáveis de ambiente)
+
+O limite do pod é 512Mi: cada worker é um processo com sua própria cópia
+da aplicação, então a concorrência extra vem das threads (gthread).
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Exportações grandes podem levar mais que o padrão de 30s
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recicla workers periodicamente para conter crescimento de memória
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+# Métricas Prometheus com vários workers (PROMETHEUS_MULTIPROC_DIR)
+def on_starting(server):
+    pasta = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+        for nome in os.listdir(pasta):
+            os.remove(os.path.join(pasta, nome))
+
+
+# Métricas agregadas de todos os workers numa porta interna, sem login
+# (METRICS_PORT). Servidas pelo master: o scrape do Prometheus por annotation
+# não envia o token exigido pelo /metrics da aplicação.
+def when_ready(server):
+    porta = os.getenv('METRICS_PORT')
+    if porta and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import CollectorRegistry, start_http_server
+        from prometheus_client import multiprocess
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        start_http_server(int(porta), registry=registro)
+        server.log.info('Métricas do Prometheus em :%s/metrics', porta)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
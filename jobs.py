@@ -0,0 +1,251 @@
+"""
+Fila de jobs de exportação executados em segundo plano
+
+O estado de cada job fica num arquivo JSON no spool, ao lado do arquivo
+gerado, para que qualquer worker do gunicorn (processos separados, mesma
+pasta) consulte o progresso e entregue o download.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+_ID_VALIDO = re.compile(r'[0-9a-f]{32}')
+
+
+def _processo_ativo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """Estado de um job de exportação"""
+
+    def __init__(self, chave, formato, filtros):
+        self.id = uuid.uuid4().hex
+        self.chave = chave
+        self.formato = formato
+        self.filtros = filtros
+        self.status = 'pendente'
+        self.linhas_processadas = 0
+        self.total_linhas = None
+        self.arquivo = None
+        self.erro = None
+        self.criado_em = time.time()
+        self.concluido_em = None
+        self.pid = os.getpid()
+        self._ao_progresso = None
+
+    @property
+    def ativo(self):
+        return self.status in ('pendente', 'processando')
+
+    def registrar_progresso(self, quantidade):
+        self.linhas_processadas += quantidade
+        if self._ao_progresso is not None:
+            self._ao_progresso(self)
+
+    def to_dict(self):
+        progresso = None
+        if self.status == 'concluido':
+            progresso = 100.0
+        elif self.total_linhas:
+            progresso = round(min(self.linhas_processadas / self.total_linhas, 1) * 100, 1)
+
+        return {
+            'id': self.id,
+            'formato': self.formato,
+            'filtros': self.filtros,
+            'status': self.status,
+            'linhas_processadas': self.linhas_processadas,
+            'total_linhas': self.total_linhas,
+            'progresso': progresso,
+            'erro': self.erro,
+            'criado_em': self.criado_em,
+            'concluido_em': self.concluido_em
+        }
+
+    def estado(self):
+        """Tudo o que é gravado no arquivo de estado"""
+        return {**self.to_dict(), 'chave': self.chave, 'arquivo': self.arquivo, 'pid': self.pid}
+
+    @classmethod
+    def de_estado(cls, dados):
+        job = cls.__new__(cls)
+        job._ao_progresso = None
+        for campo in ('id', 'chave', 'formato', 'filtros', 'status', 'linhas_processadas',
+                      'total_linhas', 'arquivo', 'erro', 'criado_em', 'concluido_em', 'pid'):
+            setattr(job, campo, dados.get(campo))
+        return job
+
+
+class GerenciadorJobs:
+    """
+    Executa os jobs em um pool de threads e guarda arquivos e estado no spool.
+
+    Pedidos idênticos (mesma chave) enquanto um job ainda está em andamento
+    reaproveitam esse job, mesmo vindos de outro worker: a chave é reservada
+    com um arquivo criado de forma atômica (os.link). Jobs finalizados expiram
+    após `ttl` segundos e seus arquivos são removidos. Um job cujo processo
+    terminou antes de concluir é marcado como erro.
+    """
+
+    # Intervalo mínimo (segundos) entre gravações do progresso
+    INTERVALO_PROGRESSO = 0.5
+    # Intervalo mínimo (segundos) entre varreduras de jobs expirados
+    INTERVALO_LIMPEZA = 60
+
+    def __init__(self, pasta, workers=2, ttl=3600):
+        self.pasta = pasta
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='exportacao')
+        self._ultimo_progresso = {}
+        self._proxima_limpeza = 0.0
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho_estado(self, job_id):
+        return os.path.join(self.pasta, f'{job_id}.json')
+
+    def _caminho_reserva(self, chave):
+        resumo = hashlib.sha1(json.dumps(chave).encode('utf-8')).hexdigest()
+        return os.path.join(self.pasta, f'{resumo}.chave')
+
+    def _gravar(self, job):
+        temporario = f'{self._caminho_estado(job.id)}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(job.estado(), arquivo)
+        os.replace(temporario, self._caminho_estado(job.id))
+
+    def _ler(self, caminho):
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                return Job.de_estado(json.load(arquivo))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _reservar(self, chave, job_id):
+        """True se a chave ficou com `job_id`; False se já estava reservada"""
+        reserva = self._caminho_reserva(chave)
+        temporario = f'{reserva}.{job_id}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(job_id)
+        try:
+            os.link(temporario, reserva)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(temporario)
+
+    def _liberar(self, chave, job_id):
+        reserva = self._caminho_reserva(chave)
+        try:
+            with open(reserva, encoding='utf-8') as arquivo:
+                if arquivo.read() == job_id:
+                    os.remove(reserva)
+        except FileNotFoundError:
+            pass
+
+    def _job_reservado(self, chave):
+        try:
+            with open(self._caminho_reserva(chave), encoding='utf-8') as arquivo:
+                return self.obter(arquivo.read())
+        except FileNotFoundError:
+            return None
+
+    def submeter(self, chave, formato, filtros, construir):
+        """
+        Enfileira um job. `construir(caminho, job)` grava o arquivo em `caminho`.
+        Retorna (job, criado) onde `criado` é False quando o job foi reaproveitado.
+        """
+        self.limpar_expirados()
+        chave = list(chave)
+
+        job = Job(chave, formato, filtros)
+        self._gravar(job)
+        while not self._reservar(chave, job.id):
+            existente = self._job_reservado(chave)
+            if existente is not None and existente.ativo:
+                os.remove(self._caminho_estado(job.id))
+                return existente, False
+            # Reserva de um job já finalizado (ou perdido): libera e tenta de novo
+            try:
+                os.remove(self._caminho_reserva(chave))
+            except FileNotFoundError:
+                pass
+
+        job._ao_progresso = self._gravar_progresso
+        self._executor.submit(self._executar, job, construir)
+        return job, True
+
+    def obter(self, job_id):
+        if not _ID_VALIDO.fullmatch(job_id or ''):
+            return None
+        self.limpar_expirados()
+        job = self._ler(self._caminho_estado(job_id))
+        if job is not None and job.ativo and not _processo_ativo(job.pid):
+            job.status = 'erro'
+            job.erro = 'Exportação interrompida (worker encerrado)'
+            job.concluido_em = time.time()
+            self._gravar(job)
+        return job
+
+    def _gravar_progresso(self, job):
+        agora = time.monotonic()
+        if agora - self._ultimo_progresso.get(job.id, 0) >= self.INTERVALO_PROGRESSO:
+            self._ultimo_progresso[job.id] = agora
+            self._gravar(job)
+
+    def _executar(self, job, construir):
+        job.status = 'processando'
+        self._gravar(job)
+        destino = os.path.join(self.pasta, f'{job.id}.{job.formato}')
+        parcial = destino + '.parcial'
+        try:
+            construir(parcial, job)
+            os.replace(parcial, destino)
+            job.arquivo = destino
+            job.status = 'concluido'
+        except Exception as e:
+            job.erro = str(e)
+            job.status = 'erro'
+            if os.path.exists(parcial):
+                os.remove(parcial)
+        finally:
+            job.concluido_em = time.time()
+            self._gravar(job)
+            self._ultimo_progresso.pop(job.id, None)
+            self._liberar(job.chave, job.id)
+
+    def limpar_expirados(self, forcar=False):
+        agora = time.monotonic()
+        if not forcar and agora < self._proxima_limpeza:
+            return
+        self._proxima_limpeza = agora + self.INTERVALO_LIMPEZA
+
+        limite = time.time() - self.ttl
+        try:
+            entradas = [entrada.path for entrada in os.scandir(self.pasta)
+                        if entrada.name.endswith('.json')]
+        except FileNotFoundError:
+            return
+
+        for caminho in entradas:
+            job = self._ler(caminho)
+            if job is None or job.concluido_em is None or job.concluido_em >= limite:
+                continue
+            for arquivo in (job.arquivo, caminho):
+                try:
+                    if arquivo:
+                        os.remove(arquivo)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,48 @@
+"""
+Provider JSON do Flask baseado em orjson (opcional)
+
+Produz os mesmos documentos JSON do provider padrão (chaves ordenadas,
+Decimal como texto, datas no formato HTTP), mas serializa em C. Tipos que o
+orjson não aceita (ex.: inteiros acima de 64 bits) caem no provider padrão.
+"""
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+
+    def _opcoes(self):
+        # Datas passam pelo `default` do Flask para manter o mesmo formato
+        opcoes = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        return opcoes
+
+    def _serializar(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self._opcoes())
+
+    def dumps(self, obj, **kwargs):
+        # Argumentos específicos do json da stdlib (indent etc.) usam o padrão
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._serializar(obj).decode()
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._app.debug:
+            # Em debug o padrão indenta a saída
+            return super().response(obj)
+        try:
+            corpo = self._serializar(obj) + b'\n'
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(corpo, mimetype=self.mimetype)
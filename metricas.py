@@ -0,0 +1,122 @@
+"""
+Métricas no formato Prometheus (requisições, SQL por requisição e exportações)
+
+Com vários workers do gunicorn, defina PROMETHEUS_MULTIPROC_DIR para que o
+/metrics agregue os valores de todos os processos (ver gunicorn.conf.py).
+"""
+
+import os
+import time
+
+from flask import g, request, has_request_context
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+BUCKETS_BYTES = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8)
+
+requisicoes_total = Counter(
+    'http_requests_total', 'Requisições HTTP atendidas',
+    ['endpoint', 'method', 'status']
+)
+requisicao_duracao = Histogram(
+    'http_request_duration_seconds', 'Latência das requisições por endpoint',
+    ['endpoint'], buckets=BUCKETS_LATENCIA
+)
+sql_consultas = Histogram(
+    'db_queries_per_request', 'Consultas SQL executadas por requisição',
+    ['endpoint'], buckets=BUCKETS_CONSULTAS
+)
+sql_duracao = Histogram(
+    'db_query_seconds_per_request', 'Tempo total em SQL por requisição',
+    ['endpoint'], buckets=BUCKETS_LATENCIA
+)
+exportacao_bytes = Histogram(
+    'export_size_bytes', 'Tamanho dos arquivos exportados',
+    ['formato'], buckets=BUCKETS_BYTES
+)
+fragmentos_cache = Counter(
+    'fragment_cache_requests_total', 'Consultas ao cache de fragmentos HTML',
+    ['fragmento', 'resultado']
+)
+replica_disponivel = Gauge(
+    'db_replica_up', 'Réplica de leitura respondendo (1) ou fora de uso (0)',
+    multiprocess_mode='min'
+)
+
+# Endpoints que não entram nas métricas de requisição
+ENDPOINTS_IGNORADOS = {'static', 'metrics', 'healthz', 'readyz', 'startupz'}
+
+
+def registrar_exportacao(formato, tamanho):
+    exportacao_bytes.labels(formato=formato).observe(tamanho)
+
+
+def registrar_fragmento(fragmento, acerto):
+    fragmentos_cache.labels(fragmento=fragmento, resultado='hit' if acerto else 'miss').inc()
+
+
+def registrar_replica(ok):
+    replica_disponivel.set(1 if ok else 0)
+
+
+def _endpoint():
+    return request.endpoint or 'desconhecido'
+
+
+def _antes_requisicao():
+    g.metricas_inicio = time.perf_counter()
+    g.sql_consultas = 0
+    g.sql_tempo = 0.0
+
+
+def _depois_requisicao(response):
+    inicio = g.pop('metricas_inicio', None)
+    endpoint = _endpoint()
+    if inicio is None or endpoint in ENDPOINTS_IGNORADOS:
+        return response
+
+    requisicao_duracao.labels(endpoint=endpoint).observe(time.perf_counter() - inicio)
+    requisicoes_total.labels(endpoint=endpoint, method=request.method,
+                             status=str(response.status_code)).inc()
+    sql_consultas.labels(endpoint=endpoint).observe(g.get('sql_consultas', 0))
+    sql_duracao.labels(endpoint=endpoint).observe(g.get('sql_tempo', 0.0))
+    return response
+
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context.metricas_inicio_sql = time.perf_counter()
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, 'metricas_inicio_sql', None)
+    if inicio is None or not has_request_context():
+        return
+    g.sql_consultas = g.get('sql_consultas', 0) + 1
+    g.sql_tempo = g.get('sql_tempo', 0.0) + time.perf_counter() - inicio
+
+
+def registrar(app):
+    """Conecta os hooks do Flask e do SQLAlchemy (todas as engines)"""
+    app.before_request(_antes_requisicao)
+    app.after_request(_depois_requisicao)
+
+    if not event.contains(Engine, 'before_cursor_execute', _antes_sql):
+        event.listen(Engine, 'before_cursor_execute', _antes_sql)
+        event.listen(Engine, 'after_cursor_execute', _depois_sql)
+
+
+def gerar_metricas():
+    """Retorna (corpo, content_type) com as métricas de todos os workers"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
@@ -0,0 +1,75 @@
+"""
+Pool de conexões com medição do tempo de espera no checkout
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que acumula quantas vezes e por quanto tempo se esperou por uma conexão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._lock_metricas:
+                self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._lock_metricas:
+                self.checkouts += 1
+                self.espera_total += espera
+                if espera > self.espera_maxima:
+                    self.espera_maxima = espera
+
+    def recreate(self):
+        # Mantém as métricas quando o pool é recriado (ex.: após invalidação)
+        novo = super().recreate()
+        novo.checkouts = self.checkouts
+        novo.espera_total = self.espera_total
+        novo.espera_maxima = self.espera_maxima
+        novo.timeouts = self.timeouts
+        return novo
+
+
+def estatisticas_pool(engine):
+    """Resumo do estado do pool de um engine (apenas leitura, sem I/O)"""
+    pool = engine.pool
+    dados = {
+        'classe': type(pool).__name__,
+        'status': pool.status(),
+    }
+
+    if isinstance(pool, QueuePool):
+        dados.update({
+            'tamanho': pool.size(),
+            'em_uso': pool.checkedout(),
+            'disponiveis': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+        })
+
+    if isinstance(pool, QueuePoolMedido):
+        dados.update({
+            'checkouts': pool.checkouts,
+            'timeouts': pool.timeouts,
+            'espera_total_ms': round(pool.espera_total * 1000, 3),
+            'espera_media_ms': round(pool.espera_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            'espera_maxima_ms': round(pool.espera_maxima * 1000, 3),
+        })
+
+    return dados
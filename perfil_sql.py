@@ -0,0 +1,143 @@
+"""
+Perfil de SQL por requisição (desenvolvimento e testes)
+
+Ativado com SQL_PROFILING=1 (ou app.config['SQL_PROFILING']): cada
+requisição registra as consultas executadas, o tempo total e os comandos
+repetidos (sintoma de N+1). Requisições acima dos limites são registradas no
+log com os piores comandos e as respostas ganham os headers X-SQL-Queries e
+X-SQL-Time-ms.
+
+Em testes, `capturar_consultas()` expõe o mesmo perfil:
+
+    with capturar_consultas() as perfil:
+        client.get('/api/linhas')
+    assert perfil.total <= 2
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class PerfilSQL:
+    """Consultas executadas em um trecho (requisição ou bloco de teste)"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def registrar(self, comando, duracao):
+        self.consultas.append((comando, duracao))
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def tempo_total(self):
+        return sum(duracao for _, duracao in self.consultas)
+
+    def duplicadas(self):
+        """Comandos executados mais de uma vez: {comando: vezes}"""
+        contagem = Counter(comando for comando, _ in self.consultas)
+        return {comando: vezes for comando, vezes in contagem.items() if vezes > 1}
+
+    def piores(self, quantidade=5):
+        """Comandos com maior tempo acumulado: [(comando, vezes, segundos)]"""
+        acumulado = {}
+        for comando, duracao in self.consultas:
+            vezes, tempo = acumulado.get(comando, (0, 0.0))
+            acumulado[comando] = (vezes + 1, tempo + duracao)
+        ordenados = sorted(acumulado.items(), key=lambda item: item[1][1], reverse=True)
+        return [(comando, vezes, tempo) for comando, (vezes, tempo) in ordenados[:quantidade]]
+
+
+def _perfis_ativos():
+    perfis = list(getattr(_local, 'capturas', ()))
+    if has_request_context():
+        perfil = g.get('perfil_sql')
+        if perfil is not None:
+            perfis.append(perfil)
+    return perfis
+
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.perfil_inicio_sql = time.perf_counter()
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, 'perfil_inicio_sql', None)
+    if inicio is None:
+        return
+    perfis = _perfis_ativos()
+    if perfis:
+        duracao = time.perf_counter() - inicio
+        for perfil in perfis:
+            perfil.registrar(statement, duracao)
+
+
+def _ativar_eventos():
+    if not event.contains(Engine, 'before_cursor_execute', _antes_sql):
+        event.listen(Engine, 'before_cursor_execute', _antes_sql)
+        event.listen(Engine, 'after_cursor_execute', _depois_sql)
+
+
+@contextmanager
+def capturar_consultas():
+    """Registra todas as consultas executadas nesta thread dentro do bloco"""
+    _ativar_eventos()
+    perfil = PerfilSQL()
+    capturas = getattr(_local, 'capturas', None)
+    if capturas is None:
+        capturas = _local.capturas = []
+    capturas.append(perfil)
+    try:
+        yield perfil
+    finally:
+        capturas.remove(perfil)
+
+
+def registrar(app):
+    """Liga o perfil por requisição quando SQL_PROFILING estiver ativo"""
+    if not app.config.get('SQL_PROFILING'):
+        return
+
+    _ativar_eventos()
+    max_consultas = app.config.get('SQL_PROFILING_MAX_CONSULTAS', 10)
+    lento_ms = app.config.get('SQL_PROFILING_LENTO_MS', 200)
+
+    @app.before_request
+    def _iniciar_perfil():
+        g.perfil_sql = PerfilSQL()
+
+    @app.after_request
+    def _finalizar_perfil(response):
+        perfil = g.pop('perfil_sql', None)
+        if perfil is None:
+            return response
+
+        tempo_ms = perfil.tempo_total * 1000
+        response.headers['X-SQL-Queries'] = str(perfil.total)
+        response.headers['X-SQL-Time-ms'] = f'{tempo_ms:.1f}'
+
+        duplicadas = perfil.duplicadas()
+        if perfil.total > max_consultas or duplicadas or tempo_ms > lento_ms:
+            piores = '\n'.join(
+                f'    {vezes}x {tempo * 1000:.1f} ms  {" ".join(comando.split())[:200]}'
+                for comando, vezes, tempo in perfil.piores()
+            )
+            logger.warning(
+                'SQL %s %s: %d consultas, %.1f ms, %d comandos repetidos\n%s',
+                request.method, request.path, perfil.total, tempo_ms, len(duplicadas), piores
+            )
+        return response
@@ -0,0 +1,79 @@
+"""
+Leitura em réplica (opcional)
+
+Com DATABASE_REPLICA_URL configurada, o engine da réplica é registrado como
+bind 'replica' e as rotas marcadas com @leitura_na_replica executam suas
+consultas nele. Flushes e comandos de escrita continuam no primário.
+
+Read-your-writes: após um commit do próprio usuário (registrar_escrita), as
+leituras dele voltam ao primário por REPLICA_JANELA_ESCRITA segundos, tempo
+para a réplica alcançar o primário.
+
+Disponibilidade: uma verificação periódica (ver app.py) marca a réplica como
+indisponível quando ela não responde; enquanto isso as leituras vão ao primário.
+"""
+
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+BIND_REPLICA = 'replica'
+_CHAVE_SESSAO = '_ultima_escrita'
+
+_disponivel = True
+
+
+class SessaoComReplica(Session):
+    """Session que envia as leituras para a réplica quando `g.ler_da_replica` estiver ativo"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('ler_da_replica'):
+            engine = self._db.engines.get(BIND_REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def configurada():
+    return BIND_REPLICA in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def disponivel():
+    return _disponivel
+
+
+def marcar_disponibilidade(ok):
+    """Atualiza o estado da réplica; True quando ele mudou"""
+    global _disponivel
+    mudou = _disponivel != ok
+    _disponivel = ok
+    return mudou
+
+
+def registrar_escrita():
+    """Chamar após o commit de uma escrita feita pelo usuário da requisição"""
+    if has_request_context() and configurada():
+        session[_CHAVE_SESSAO] = time.time()
+
+
+def escrita_recente():
+    janela = current_app.config.get('REPLICA_JANELA_ESCRITA', 10)
+    return time.time() - session.get(_CHAVE_SESSAO, 0) < janela
+
+
+def ativar():
+    """Envia as leituras do contexto atual para a réplica (se configurada e no ar)"""
+    if configurada() and _disponivel:
+        g.ler_da_replica = True
+
+
+def leitura_na_replica(view):
+    """Rotas somente leitura: consultas na réplica, salvo logo após uma escrita do usuário"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not escrita_recente():
+            ativar()
+        return view(*args, **kwargs)
+    return wrapper
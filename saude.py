@@ -0,0 +1,86 @@
+"""
+Verificações de saúde usadas pelos probes do Kubernetes
+
+- liveness (/healthz): só confirma que o processo responde; não toca no banco.
+- readiness (/readyz): SELECT 1 numa conexão do pool do primário, com tempo
+  máximo. O resultado fica guardado por alguns segundos, então probes
+  frequentes (e vários pods) não viram carga no banco. A réplica de leitura
+  não entra na decisão: é verificada à parte (verificar_conexao) e, fora do
+  ar, as leituras voltam ao primário.
+- startup (/startupz): espera o esquema criado pelo Job init-db (tabelas e
+  colunas dos modelos). Depois de confirmado, não é verificado de novo.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from sqlalchemy import inspect, text
+
+from cache import SnapshotCache
+
+# Tempo máximo (segundos) para obter a conexão do pool e executar o SELECT 1
+PRONTIDAO_TIMEOUT = float(os.getenv('READINESS_TIMEOUT', '2'))
+# Por quanto tempo (segundos) o resultado do readiness é reaproveitado
+PRONTIDAO_CACHE_TTL = float(os.getenv('READINESS_CACHE_TTL', '5'))
+
+# Uma thread por banco: verificações presas num banco lento não acumulam
+# conexões nem atrasam a verificação do outro
+_executores = {
+    'principal': ThreadPoolExecutor(max_workers=1, thread_name_prefix='saude'),
+    'replica': ThreadPoolExecutor(max_workers=1, thread_name_prefix='saude-replica'),
+}
+_prontidao = SnapshotCache(ttl=PRONTIDAO_CACHE_TTL)
+_esquema_pronto = False
+
+
+def _executar(funcao, *args, banco='principal'):
+    return _executores[banco].submit(funcao, *args).result(timeout=PRONTIDAO_TIMEOUT)
+
+
+def _select_1(engine):
+    with engine.connect() as conexao:
+        conexao.execute(text('SELECT 1'))
+
+
+def verificar_conexao(engine, banco='principal'):
+    """SELECT 1 com tempo máximo; devolve None se ok ou a mensagem de erro"""
+    try:
+        _executar(_select_1, engine, banco=banco)
+    except FuturesTimeoutError:
+        return f'sem resposta em {PRONTIDAO_TIMEOUT:g}s'
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def prontidao(engine):
+    """{'pronto', 'erro'} do SELECT 1 no primário, com cache curto"""
+    def verificar():
+        erro = verificar_conexao(engine)
+        return {'pronto': erro is None, 'erro': erro}
+    return _prontidao.obter(verificar)
+
+
+def _pendencias_esquema(engine, metadata):
+    inspetor = inspect(engine)
+    existentes = set(inspetor.get_table_names())
+    pendentes = []
+    for tabela in metadata.sorted_tables:
+        if tabela.name not in existentes:
+            pendentes.append(tabela.name)
+            continue
+        colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        pendentes.extend(
+            f'{tabela.name}.{coluna.name}' for coluna in tabela.columns if coluna.name not in colunas
+        )
+    return pendentes
+
+
+def pendencias_esquema(engine, metadata):
+    """Tabelas/colunas dos modelos que ainda não existem no banco ([] quando pronto)"""
+    global _esquema_pronto
+    if _esquema_pronto:
+        return []
+    pendentes = _executar(_pendencias_esquema, engine, metadata)
+    _esquema_pronto = not pendentes
+    return pendentes
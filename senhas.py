@@ -0,0 +1,42 @@
+"""
+Hash de senhas executado em um pool limitado de threads
+
+O hashlib libera o GIL durante o PBKDF2/scrypt, então o pool limita quantos
+hashes rodam ao mesmo tempo sem travar as demais threads do worker: num pico
+de logins, as requisições comuns continuam sendo atendidas enquanto os
+logins esperam a vez no pool.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Método/custo no formato do werkzeug, ex.: 'scrypt:32768:8:1' ou 'pbkdf2:sha256:600000'
+METODO_HASH = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Hashes simultâneos por worker
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+# Tempo máximo (segundos) esperando vaga no pool + cálculo
+HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='hash-senha')
+
+
+def gerar_hash(senha):
+    return _executor.submit(generate_password_hash, senha, METODO_HASH).result(timeout=HASH_TIMEOUT)
+
+
+def verificar_hash(senha_hash, senha):
+    return _executor.submit(check_password_hash, senha_hash, senha).result(timeout=HASH_TIMEOUT)
+
+
+@lru_cache(maxsize=1)
+def _prefixo_atual():
+    # O werkzeug normaliza o método (ex.: 'scrypt' -> 'scrypt:32768:8:1')
+    return generate_password_hash('', METODO_HASH).split('$', 1)[0]
+
+
+def precisa_rehash(senha_hash):
+    """True quando o hash foi gerado com método/custo diferente do configurado"""
+    return senha_hash.split('$', 1)[0] != _prefixo_atual()
@@ -0,0 +1,94 @@
+"""
+Fixtures dos testes: aplicação em SQLite (primário + réplica em arquivos locais)
+
+A aplicação é única por processo (create_app devolve sempre a mesma
+instância), então o banco é criado uma vez por sessão de testes. A "réplica"
+é uma cópia do primário feita com a API de backup do SQLite; `replicar()`
+sincroniza de novo após testes que escrevem.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+PASTA = tempfile.mkdtemp(prefix='projeto_contas_testes_')
+PRIMARIO = os.path.join(PASTA, 'primario.db')
+REPLICA = os.path.join(PASTA, 'replica.db')
+
+# Lidas no import do app.py
+os.environ.setdefault('EXPORT_CACHE_DIR', os.path.join(PASTA, 'cache-exportacoes'))
+os.environ.setdefault('EXPORT_SPOOL_DIR', os.path.join(PASTA, 'spool'))
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+os.environ.pop('METRICS_TOKEN', None)
+
+QUANTIDADE_LINHAS = 30
+DEPARTAMENTOS = ['TI', 'RH', 'Financeiro', 'Comercial']
+STATUS = ['Ativa', 'A Cancelar', 'Cancelada']
+
+
+def gerar_linhas(quantidade):
+    hoje = date.today()
+    for i in range(quantidade):
+        yield {
+            'conta': f'10000{i % 5}',
+            'linha': f'1199{i:07d}',
+            'plano': 'Smart 10GB' if i % 2 else 'Controle 5GB',
+            'mensalidade': 50 + i,
+            'responsavel': f'Responsável {i}',
+            'departamento': DEPARTAMENTOS[i % len(DEPARTAMENTOS)],
+            'chipeira': 'Sim' if i % 3 else 'Não',
+            'efetivacao': hoje - timedelta(days=365),
+            'termino': hoje + timedelta(days=10 * i),
+            'status': STATUS[i % len(STATUS)],
+            'uso': 'Sim',
+            'fase': '',
+        }
+
+
+def replicar():
+    """Copia o primário para a réplica (simula a replicação em dia)"""
+    origem = sqlite3.connect(PRIMARIO)
+    destino = sqlite3.connect(REPLICA)
+    try:
+        origem.backup(destino)
+    finally:
+        origem.close()
+        destino.close()
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as modulo
+
+    aplicacao = modulo.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{PRIMARIO}',
+        'DATABASE_REPLICA_URL': f'sqlite:///{REPLICA}',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'VENCIMENTOS_INTERVALO': 0,
+    })
+    with aplicacao.app_context():
+        assert modulo.init_db()
+        with modulo.db.engine.begin() as conn:
+            conn.execute(modulo.Linha.__table__.insert(), list(gerar_linhas(QUANTIDADE_LINHAS)))
+            modulo.preencher_lookups(conn)
+        modulo.reconstruir_custos_mensais()
+    replicar()
+    return aplicacao
+
+
+@pytest.fixture
+def client(app):
+    """Cliente logado como o admin criado pelo init_db"""
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'nome': 'admin', 'senha': 'admin123'})
+    assert resposta.status_code == 302
+    return cliente
@@ -0,0 +1,16 @@
+import pytest
+
+
+def test_create_app_repetido_devolve_a_mesma_instancia(app):
+    import app as modulo
+
+    assert modulo.create_app() is app
+    assert modulo.create_app({'TESTING': True}) is app
+
+
+def test_create_app_repetido_com_outra_configuracao_falha(app):
+    import app as modulo
+
+    with pytest.raises(RuntimeError, match='SQLALCHEMY_DATABASE_URI'):
+        modulo.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:////tmp/outro.db'})
+    assert app.config['SQLALCHEMY_DATABASE_URI'] != 'sqlite:////tmp/outro.db'
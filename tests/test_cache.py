@@ -0,0 +1,32 @@
+from cache import CacheBytes, SnapshotCache
+
+
+def test_snapshot_atualizar_nao_sobrescreve_invalidacao():
+    cache = SnapshotCache(ttl=60)
+    valores = iter(['antigo', 'novo'])
+
+    def carregar_com_escrita_concorrente():
+        valor = next(valores)
+        cache.invalidar()  # escrita commitada durante o recálculo
+        return valor
+
+    assert cache.atualizar(carregar_com_escrita_concorrente) == 'antigo'
+    assert cache.obter(lambda: 'novo') == 'novo'
+
+
+def test_snapshot_atualizar_guarda_valor():
+    cache = SnapshotCache(ttl=60)
+    cache.atualizar(lambda: 1)
+    assert cache.obter(lambda: 2) == 1
+
+
+def test_cache_bytes_limites():
+    cache = CacheBytes(maxsize=3, max_bytes=10)
+    cache.definir('a', 'A', 4)
+    cache.definir('b', 'B', 4)
+    assert cache.obter('a') == 'A'  # 'b' passa a ser o menos usado
+    cache.definir('c', 'C', 4)
+    assert cache.obter('b') is None
+    assert cache.bytes == 8 and len(cache) == 2
+    cache.definir('grande', 'G', 11)
+    assert cache.obter('grande') is None
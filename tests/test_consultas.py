@@ -0,0 +1,55 @@
+"""
+Orçamento de consultas SQL por rota (perfil_sql.capturar_consultas)
+
+Cada rota é chamada uma vez antes da medição para aquecer os caches do
+processo (usuário logado, lookups, snapshot de estatísticas, fragmentos).
+"""
+
+import pytest
+
+from perfil_sql import capturar_consultas
+
+
+def consultas(client, url):
+    client.get(url)
+    with capturar_consultas() as perfil:
+        resposta = client.get(url)
+    assert resposta.status_code == 200, resposta.status_code
+    return perfil, resposta
+
+
+@pytest.mark.parametrize('url', ['/api/linhas', '/api/linhas?page=2&per_page=10',
+                                 '/api/linhas?search=Responsável'])
+def test_api_linhas_paginada(client, url):
+    # Versão da tabela + COUNT + página
+    perfil, _ = consultas(client, url)
+    assert perfil.total <= 3, perfil.consultas
+
+
+def test_api_linhas_cursor(client):
+    # Versão da tabela + página (sem COUNT)
+    perfil, resposta = consultas(client, '/api/linhas?after=&per_page=10')
+    assert perfil.total <= 2, perfil.consultas
+
+    proximo = resposta.get_json()['pagination']['next_cursor']
+    perfil, _ = consultas(client, f'/api/linhas?after={proximo}&per_page=10')
+    assert perfil.total <= 2, perfil.consultas
+
+
+def test_linhas_fragmento_em_cache(client):
+    # Página já renderizada: só a versão da tabela
+    perfil, resposta = consultas(client, '/linhas?page=2&per_page=10')
+    assert perfil.total == 1, perfil.consultas
+    assert b'Mostrando 11 - 20' in resposta.data
+
+
+def test_api_dashboard_stats(client):
+    # Snapshot em cache: só a versão da tabela
+    perfil, _ = consultas(client, '/api/dashboard/stats')
+    assert perfil.total <= 1, perfil.consultas
+
+
+def test_dashboard(client):
+    # Snapshots em cache: só a versão da tabela
+    perfil, _ = consultas(client, '/dashboard')
+    assert perfil.total <= 1, perfil.consultas
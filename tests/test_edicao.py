@@ -0,0 +1,40 @@
+from conftest import replicar
+from test_importacao import rollup
+
+
+def reconstruido_igual_incremental(app):
+    import app as modulo
+
+    with app.app_context():
+        incremental = rollup(modulo)
+        modulo.reconstruir_custos_mensais()
+        return incremental == rollup(modulo)
+
+
+def test_editar_e_excluir_mantem_rollup(app, client):
+    import app as modulo
+
+    with app.app_context():
+        modulo.reconstruir_custos_mensais()
+
+    resposta = client.post('/linhas/editar/3', data={
+        'conta': '100002', 'linha': '(11) 99000-0002', 'plano': 'Smart 10GB',
+        'mensalidade': '123,45', 'responsavel': 'Responsável 2', 'departamento': 'Compras',
+        'chipeira': 'Sim', 'efetivacao': '2024-01-01', 'termino': '2026-01-01',
+        'status': 'Ativa', 'uso': 'Sim', 'fase': '',
+    })
+    assert resposta.status_code == 302
+    resposta = client.post('/linhas/excluir/30')
+    assert resposta.status_code == 302
+    replicar()
+
+    with app.app_context():
+        assert str(modulo.db.session.get(modulo.Linha, 3).mensalidade) == '123.45'
+        assert modulo.db.session.get(modulo.Linha, 30) is None
+    assert reconstruido_igual_incremental(app)
+
+
+def test_excluir_linha_inexistente(app, client):
+    resposta = client.post('/linhas/excluir/999999', follow_redirects=True)
+    assert resposta.status_code == 200
+    assert reconstruido_igual_incremental(app)
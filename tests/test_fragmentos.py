@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.mark.parametrize('page, per_page, total', [
+    (2, 200, 250), (1, 10, 35), (4, 10, 35), (9, 10, 35), (0, 10, 35), (1, 0, 35),
+])
+def test_paginacao_em_cache_igual_a_paginate(app, page, per_page, total):
+    import app as modulo
+    from flask_sqlalchemy.pagination import Pagination
+
+    class PaginacaoReferencia(Pagination):
+        def _query_items(self):
+            inicio = (self.page - 1) * self.per_page
+            return list(range(total))[inicio:inicio + self.per_page]
+
+        def _query_count(self):
+            return total
+
+    with app.test_request_context('/linhas'):
+        # Mesmos argumentos que query.paginate() recebe em renderizar_fragmento_linhas
+        esperado = PaginacaoReferencia(page=page, per_page=per_page, max_per_page=None, error_out=False)
+        fragmento = {'total': total, 'quantidade': len(esperado.items)}
+        obtido = modulo.paginacao_fragmento(page, per_page, fragmento)
+
+    for atributo in ('page', 'per_page', 'total', 'pages', 'first', 'last', 'has_prev', 'has_next'):
+        assert getattr(obtido, atributo) == getattr(esperado, atributo), atributo
+    assert list(obtido.iter_pages()) == list(esperado.iter_pages())
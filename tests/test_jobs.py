@@ -0,0 +1,53 @@
+import threading
+import time
+
+from jobs import GerenciadorJobs
+
+
+def esperar(gerenciador, job_id, limite=5):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        job = gerenciador.obter(job_id)
+        if not job.ativo:
+            return job
+        time.sleep(0.02)
+    raise AssertionError('job não terminou')
+
+
+def test_estado_compartilhado_entre_workers(tmp_path):
+    # Dois gerenciadores na mesma pasta simulam dois workers do gunicorn
+    worker_a = GerenciadorJobs(str(tmp_path), workers=1)
+    worker_b = GerenciadorJobs(str(tmp_path), workers=1)
+    liberar = threading.Event()
+
+    def construir(caminho, job):
+        job.total_linhas = 2
+        job.registrar_progresso(1)
+        liberar.wait(5)
+        with open(caminho, 'w') as destino:
+            destino.write('conteudo')
+
+    job, criado = worker_a.submeter(('csv', ''), 'csv', {'search': ''}, construir)
+    assert criado
+
+    # Pedido idêntico em outro worker reaproveita o job em andamento
+    reaproveitado, criado = worker_b.submeter(('csv', ''), 'csv', {'search': ''}, construir)
+    assert not criado and reaproveitado.id == job.id
+    assert worker_b.obter(job.id).ativo
+
+    liberar.set()
+    concluido = esperar(worker_b, job.id)
+    assert concluido.status == 'concluido'
+    with open(concluido.arquivo) as arquivo:
+        assert arquivo.read() == 'conteudo'
+
+    # Depois de concluído, o mesmo pedido gera um job novo
+    novo, criado = worker_b.submeter(('csv', ''), 'csv', {'search': ''}, construir)
+    assert criado and novo.id != job.id
+    esperar(worker_b, novo.id)
+
+
+def test_obter_rejeita_id_invalido(tmp_path):
+    gerenciador = GerenciadorJobs(str(tmp_path))
+    assert gerenciador.obter('../segredo') is None
+    assert gerenciador.obter('0' * 32) is None
@@ -0,0 +1,66 @@
+import pytest
+
+from conftest import replicar
+
+
+def enviar_lote(client, operacoes):
+    return client.post('/api/linhas/batch', json={'operacoes': operacoes})
+
+
+@pytest.mark.parametrize('ids', ['12', [1.9], [True], ['3'], {'1': 1}, [1, None]])
+def test_lote_rejeita_ids_que_nao_sao_lista_de_inteiros(app, client, ids):
+    import app as modulo
+    with app.app_context():
+        versao = modulo.versao_linhas()[0]
+
+    resposta = enviar_lote(client, [{'acao': 'excluir', 'ids': ids}])
+
+    assert resposta.status_code == 400
+    resultado = resposta.get_json()['resultados'][0]
+    assert 'ids deve ser uma lista de inteiros' in resultado['erros']
+    with app.app_context():
+        assert modulo.versao_linhas()[0] == versao
+
+
+def test_lote_atualiza_ids_informados(app, client):
+    import app as modulo
+
+    resposta = enviar_lote(client, [{'acao': 'atualizar', 'ids': [4, 5, 5], 'valores': {'fase': 'Lote'}}])
+    replicar()
+
+    assert resposta.status_code == 200, resposta.get_json()
+    with app.app_context():
+        atualizadas = modulo.Linha.query.filter_by(fase='Lote').order_by(modulo.Linha.id).all()
+        assert [linha.id for linha in atualizadas] == [4, 5]
+
+
+def test_filtro_busca_mysql_com_palavra_curta_usa_like(app):
+    import app as modulo
+    from sqlalchemy.dialects import mysql
+
+    def sql(termo):
+        with app.app_context():
+            return str(modulo.filtro_busca(termo, 'mysql').compile(dialect=mysql.dialect()))
+
+    # "1" fica abaixo do tamanho mínimo do FULLTEXT e seria descartado do MATCH
+    assert 'MATCH' not in sql('Responsável 1') and 'LIKE' in sql('Responsável 1')
+    assert 'MATCH' in sql('Responsável Silva')
+
+
+def test_lote_por_busca_atinge_o_mesmo_que_a_listagem(app, client):
+    import app as modulo
+
+    replicar()
+    dados = client.get('/api/linhas?search=Responsável 1&per_page=100').get_json()['data']
+    listadas = sorted(linha['id'] for linha in dados)
+    assert listadas
+
+    resposta = enviar_lote(client, [{'acao': 'atualizar', 'filtro': {'search': 'Responsável 1'},
+                                     'valores': {'fase': 'Busca'}}])
+    replicar()
+
+    assert resposta.status_code == 200, resposta.get_json()
+    assert resposta.get_json()['total_afetadas'] == len(listadas)
+    with app.app_context():
+        atualizadas = modulo.Linha.query.filter_by(fase='Busca').order_by(modulo.Linha.id).all()
+        assert [linha.id for linha in atualizadas] == listadas
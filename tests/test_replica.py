@@ -0,0 +1,74 @@
+"""
+Leitura na réplica: primário e réplica são dois arquivos SQLite (conftest)
+"""
+
+import pytest
+
+from conftest import gerar_linhas, replicar
+
+
+def nomes_encontrados(client, busca):
+    resposta = client.get(f'/api/linhas?search={busca}')
+    assert resposta.status_code == 200
+    return sorted(linha['responsavel'] for linha in resposta.get_json()['data'])
+
+
+@pytest.fixture
+def atrasar_replica(app):
+    """Grava uma linha só no primário (a réplica ainda não alcançou)"""
+    import app as modulo
+
+    def gravar_no_primario(responsavel):
+        registro = next(gerar_linhas(1))
+        registro.update(linha='11955550001', responsavel=responsavel)
+        with app.app_context():
+            modulo.db.session.execute(modulo.Linha.__table__.insert(), [registro])
+            modulo.incrementar_versao_linhas()
+            modulo.db.session.commit()
+
+    yield gravar_no_primario
+    replicar()
+
+
+def test_leitura_vai_para_replica(client, atrasar_replica):
+    atrasar_replica('Atrasado Alfa')
+    assert nomes_encontrados(client, 'Atrasado') == []
+
+    replicar()
+    assert nomes_encontrados(client, 'Atrasado') == ['Atrasado Alfa']
+
+
+def test_escrita_do_usuario_volta_leituras_ao_primario(app, client, atrasar_replica):
+    atrasar_replica('Replicado Primeiro')
+    outro = app.test_client()
+    outro.post('/login', data={'nome': 'admin', 'senha': 'admin123'})
+
+    resposta = client.post('/linhas/adicionar', data={
+        'conta': '300100', 'linha': '(11) 95555-0002', 'plano': 'Smart 10GB',
+        'mensalidade': '25,00', 'responsavel': 'Replicado Segundo', 'departamento': 'TI',
+        'chipeira': 'Sim', 'efetivacao': '2024-01-01', 'termino': '2026-01-01',
+        'status': 'Ativa', 'uso': 'Sim', 'fase': '',
+    })
+    assert resposta.status_code == 302
+
+    # Quem escreveu lê do primário (inclusive o que outros gravaram)
+    assert nomes_encontrados(client, 'Replicado') == ['Replicado Primeiro', 'Replicado Segundo']
+    # Os demais continuam na réplica
+    assert nomes_encontrados(outro, 'Replicado') == []
+
+    # Passada a janela de read-your-writes, volta para a réplica
+    app.config['REPLICA_JANELA_ESCRITA'] = 0
+    try:
+        assert nomes_encontrados(client, 'Replicado') == []
+    finally:
+        app.config['REPLICA_JANELA_ESCRITA'] = 10
+
+
+def test_linhas_alteradas_registra_escrita_na_sessao(app):
+    import app as modulo
+    import replica
+
+    with app.test_request_context('/'):
+        assert not replica.escrita_recente()
+        modulo.linhas_alteradas()
+        assert replica.escrita_recente()
@@ -0,0 +1,72 @@
+import pytest
+
+import replica
+import saude
+from conftest import gerar_linhas, replicar
+
+
+@pytest.fixture
+def banco_fora(monkeypatch):
+    """Simula falha no SELECT 1 dos bancos informados ('principal'/'replica')"""
+    original = saude.verificar_conexao
+    fora = set()
+
+    def verificar_conexao(engine, banco='principal'):
+        return 'conexão recusada' if banco in fora else original(engine, banco)
+
+    monkeypatch.setattr(saude, 'verificar_conexao', verificar_conexao)
+    saude._prontidao.invalidar()
+    yield fora
+    saude._prontidao.invalidar()
+
+
+def test_healthz_nao_consulta_o_banco(app):
+    from perfil_sql import capturar_consultas
+
+    with capturar_consultas() as perfil:
+        resposta = app.test_client().get('/healthz')
+    assert resposta.status_code == 200
+    assert perfil.total == 0
+
+
+def test_readyz_ok(app):
+    resposta = app.test_client().get('/readyz')
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'status': 'ok', 'replica': 'ok'}
+
+
+def test_readyz_falha_sem_primario(app, banco_fora):
+    banco_fora.add('principal')
+    resposta = app.test_client().get('/readyz')
+    assert resposta.status_code == 503
+    assert resposta.get_json()['error'] == 'conexão recusada'
+
+
+def test_replica_fora_nao_derruba_readyz_e_leituras_usam_primario(app, client, banco_fora):
+    import app as modulo
+
+    banco_fora.add('replica')
+    modulo.verificar_replica()
+    try:
+        resposta = app.test_client().get('/readyz')
+        assert resposta.status_code == 200
+        assert resposta.get_json() == {'status': 'ok', 'replica': 'indisponivel'}
+
+        # Linha só no primário: visível porque a réplica saiu de uso
+        registro = next(gerar_linhas(1))
+        registro.update(linha='11944440001', responsavel='Somente Primario')
+        with app.app_context():
+            modulo.db.session.execute(modulo.Linha.__table__.insert(), [registro])
+            modulo.incrementar_versao_linhas()
+            modulo.db.session.commit()
+        dados = client.get('/api/linhas?search=Somente').get_json()['data']
+        assert [linha['responsavel'] for linha in dados] == ['Somente Primario']
+    finally:
+        banco_fora.clear()
+        modulo.verificar_replica()
+        replicar()
+    assert replica.disponivel()
+
+
+def test_startupz_com_esquema_criado(app):
+    assert app.test_client().get('/startupz').status_code == 200
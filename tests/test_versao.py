@@ -0,0 +1,21 @@
+from conftest import gerar_linhas, replicar
+
+
+def test_dashboard_recalcula_apos_escrita_em_outro_worker(app, client):
+    import app as modulo
+
+    client.get('/dashboard')
+    with app.app_context():
+        total = modulo.obter_estatisticas()['resumo']['total_linhas']
+
+        # Outro worker grava: incrementa a versão mas não invalida o cache deste
+        registro = next(gerar_linhas(1))
+        registro['linha'] = '11977776666'
+        modulo.db.session.execute(modulo.Linha.__table__.insert(), [registro])
+        modulo.incrementar_versao_linhas()
+        modulo.db.session.commit()
+    replicar()
+
+    assert client.get('/dashboard').status_code == 200
+    with app.app_context():
+        assert modulo.obter_estatisticas()['resumo']['total_linhas'] == total + 1